@@ -0,0 +1,85 @@
+"""Compare engine configurations on a small write/read workload.
+
+Each configuration gets a fresh SQLite file and runs the same crud calls:
+single-row expense inserts (one commit each, so journal/sync settings show)
+followed by keyset page reads. Engines are built here with the same helpers
+database.py uses, so the numbers track the real configuration.
+
+    python benchmarks/bench_engine.py --writes 2000 --reads 2000
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+
+def build_engine(path, echo, pragmas):
+    from sqlalchemy import create_engine, event
+
+    from expenses_api.database import engine_options, set_sqlite_pragmas
+
+    url = f"sqlite:///{path}"
+    options = engine_options(url)
+    options["echo"] = echo
+    engine = create_engine(url, **options)
+    if pragmas:
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def run(name, echo, pragmas, args, tmpdir):
+    from sqlalchemy.orm import sessionmaker
+
+    from expenses_api import crud
+    from expenses_api.database import Base
+
+    # echo writes to stdout; send it to /dev/null so only its cost is measured
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        engine = build_engine(os.path.join(tmpdir, f"{name}.db"), echo, pragmas)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine, autoflush=False)
+        with Session() as db:
+            category = crud.create_category(db, "bench")
+
+            started = time.perf_counter()
+            for i in range(args.writes):
+                crud.create_expense(db, category.id, Decimal(i % 500) + 1, "EUR")
+            writes = time.perf_counter() - started
+
+            started = time.perf_counter()
+            cursor = None
+            for _ in range(args.reads):
+                page = crud.paginate_expenses(db, size=50, cursor=cursor)
+                cursor = page.next_cursor
+            reads = time.perf_counter() - started
+        engine.dispose()
+
+    print(
+        f"{name:<16} {args.writes / writes:9.0f} writes/s {args.reads / reads:9.0f} reads/s"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writes", type=int, default=1000)
+    parser.add_argument("--reads", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix="bench-engine-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmpdir}/unused.db")
+    from expenses_api import models  # noqa: F401  (registers the tables)
+
+    for name, echo, pragmas in [
+        ("echo+defaults", True, False),
+        ("defaults", False, False),
+        ("pragmas", False, True),
+    ]:
+        run(name, echo, pragmas, args, tmpdir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
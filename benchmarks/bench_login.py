@@ -0,0 +1,116 @@
+"""Measure /auth/token throughput for a few argon2 cost settings.
+
+Runs the app in-process against a throwaway SQLite database and fires
+concurrent logins through httpx, so the numbers include the hashing pool,
+the queue limit and the user lookup, but not network or server overhead.
+
+    python benchmarks/bench_login.py --logins 200 --concurrency 16
+    python benchmarks/bench_login.py --config 2:19456:1 --config 3:65536:4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# (time_cost, memory_cost KiB, parallelism)
+DEFAULT_CONFIGS = [(1, 19456, 1), (2, 32768, 2), (3, 65536, 4)]
+
+
+def parse_config(value: str):
+    try:
+        time_cost, memory_cost, parallelism = (int(part) for part in value.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected time_cost:memory_cost:parallelism")
+    return time_cost, memory_cost, parallelism
+
+
+async def run(config, args):
+    import httpx
+
+    from expenses_api import security
+    from expenses_api.database import SessionLocal
+    from expenses_api.main import app
+    from expenses_api.models import User
+
+    security._pwd_context = security.make_password_context(*config)
+    username = "bench-{}-{}-{}".format(*config)
+    with SessionLocal() as db:
+        db.add(
+            User(
+                username=username,
+                hashed_password=security.get_password_hash("benchpass"),
+            )
+        )
+        db.commit()
+
+    transport = httpx.ASGITransport(app=app)
+    statuses: dict = {}
+    pending = iter(range(args.logins))
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def worker():
+            for _ in pending:
+                response = await client.post(
+                    "/auth/token", data={"username": username, "password": "benchpass"}
+                )
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = statuses.get(200, 0)
+    print(
+        f"t={config[0]:<2} m={config[1]:<7} p={config[2]:<2} "
+        f"{ok / elapsed:8.1f} logins/s  {elapsed * 1000 / max(ok, 1):7.1f} ms/login  "
+        f"statuses={dict(sorted(statuses.items()))}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, help="HASH_POOL_WORKERS override")
+    parser.add_argument("--queue-limit", type=int, help="HASH_QUEUE_LIMIT override")
+    parser.add_argument(
+        "--config",
+        type=parse_config,
+        action="append",
+        help="time_cost:memory_cost:parallelism, may be repeated",
+    )
+    args = parser.parse_args(argv)
+
+    # Settings are read at import time, so everything is configured up front.
+    tmpdir = tempfile.mkdtemp(prefix="bench-login-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ["DEBUG"] = "false"
+    if args.workers:
+        os.environ["HASH_POOL_WORKERS"] = str(args.workers)
+    if args.queue_limit is not None:
+        os.environ["HASH_QUEUE_LIMIT"] = str(args.queue_limit)
+
+    from expenses_api import models  # noqa: F401  (registers the tables)
+    from expenses_api.database import Base, async_engine, engine
+    from expenses_api.settings import settings
+
+    engine.echo = async_engine.echo = False
+    Base.metadata.create_all(bind=engine)
+    print(
+        f"{args.logins} logins, concurrency {args.concurrency}, "
+        f"{settings.HASH_POOL_WORKERS} hash workers, queue limit {settings.HASH_QUEUE_LIMIT}"
+    )
+    for config in args.config or DEFAULT_CONFIGS:
+        asyncio.run(run(config, args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""Compare ways of turning a page of expenses into the GET /expenses body.
+
+Every approach reads the same newest-first pages from a fresh SQLite file
+and produces the same JSON bytes:
+
+- ``orm+validate``: ORM entities, ``PaginatedExpenses(items=...)`` validated
+  from attributes, then FastAPI's response_model pass (validate again, dump
+  with pydantic-core), which is what the endpoint used to do.
+- ``rows+validate``: plain column rows validated into the models, then the
+  same response_model pass.
+- ``rows+construct``: plain column rows, ``model_construct`` (no
+  validation) and a single ``model_dump_json``.
+- ``rows+typeddict``: plain column rows as dicts, dumped in one call by a
+  TypeAdapter over TypedDicts mirroring the models, which is what the
+  endpoint does now.
+
+Pages are walked by keyset, as cursor clients do. Query and serialization
+time are reported separately, as rows/s. Exits 1 if the bodies differ.
+
+    python benchmarks/bench_serialize.py --rows 20000 --size 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+
+def populate(db, rows):
+    from expenses_api import crud
+    from expenses_api.models import User
+
+    user = User(username="bench", hashed_password="-")
+    db.add(user)
+    db.commit()
+    category = crud.create_category(db, "bench", user_id=user.id)
+    start = datetime(2024, 1, 1)
+    for offset in range(0, rows, 5000):
+        crud.bulk_create_expenses(
+            db,
+            [
+                {
+                    "category_id": category.id,
+                    "amount": Decimal(i % 5000) / 4 + 1,
+                    "currency": "EUR",
+                    "name": f"expense {i}",
+                    "created_at": start + timedelta(minutes=i),
+                }
+                for i in range(offset, min(offset + 5000, rows))
+            ],
+            user_id=user.id,
+        )
+    return user.id
+
+
+def orm_pages(db, size, pages, user_id):
+    # the endpoint's former query: ORM entities plus the keyset column
+    from sqlalchemy import select, tuple_
+
+    from expenses_api.crud import _created_at_key
+    from expenses_api.models import Expense
+
+    q = (
+        select(Expense, _created_at_key.label("created_at_key"))
+        .where(Expense.user_id == user_id)
+        .order_by(Expense.created_at.desc(), Expense.id.desc())
+    )
+    key = None
+    for _ in range(pages):
+        page = q if key is None else q.where(tuple_(_created_at_key, Expense.id) < key)
+        rows = db.execute(page.limit(size + 1)).all()[:size]
+        key = (rows[-1][1], rows[-1][0].id)
+        yield [row[0] for row in rows]
+        db.expunge_all()
+
+
+def row_pages(db, size, pages, user_id):
+    from expenses_api import crud
+
+    cursor = None
+    for _ in range(pages):
+        page = crud.paginate_expenses(db, size=size, cursor=cursor, user_id=user_id)
+        cursor = page.next_cursor
+        yield page.items
+
+
+def response_model_pass(body):
+    # what FastAPI does with a returned object and a response_model
+    from pydantic import TypeAdapter
+
+    from expenses_api.schemas import PaginatedExpenses
+
+    adapter = TypeAdapter(PaginatedExpenses)
+    return adapter.dump_json(adapter.validate_python(body, from_attributes=True))
+
+
+def orm_validate(items, size):
+    from expenses_api.schemas import PaginatedExpenses
+
+    return response_model_pass(PaginatedExpenses(items=items, size=size, page=1))
+
+
+def rows_validate(items, size):
+    from expenses_api.crud import EXPENSE_COLUMNS
+    from expenses_api.schemas import PaginatedExpenses
+
+    rows = [dict(zip(EXPENSE_COLUMNS, row)) for row in items]
+    return response_model_pass(PaginatedExpenses(items=rows, size=size, page=1))
+
+
+def rows_construct(items, size):
+    from expenses_api.crud import EXPENSE_COLUMNS
+    from expenses_api.schemas import ExpenseOut, PaginatedExpenses
+
+    return (
+        PaginatedExpenses.model_construct(
+            items=[
+                ExpenseOut.model_construct(**dict(zip(EXPENSE_COLUMNS, row)))
+                for row in items
+            ],
+            size=size,
+            page=1,
+            total=None,
+            next_cursor=None,
+            prev_cursor=None,
+        )
+        .model_dump_json()
+        .encode()
+    )  # Response encodes str bodies the same way
+
+
+def rows_typeddict(items, size):
+    from expenses_api.routers.expenses import _ITEM_FIELDS, _item_values, _page_adapter
+
+    return _page_adapter.dump_json(
+        {
+            "items": [dict(zip(_ITEM_FIELDS, _item_values(row))) for row in items],
+            "total": None,
+            "page": 1,
+            "size": size,
+            "next_cursor": None,
+            "prev_cursor": None,
+        }
+    )
+
+
+APPROACHES = [
+    ("orm+validate", orm_pages, orm_validate),
+    ("rows+validate", row_pages, rows_validate),
+    ("rows+construct", row_pages, rows_construct),
+    ("rows+typeddict", row_pages, rows_typeddict),
+]
+
+
+def run(name, fetch, serialize, db, args):
+    query = encode = 0.0
+    bodies = []
+    for _ in range(args.repeat):
+        pages = fetch(db, args.size, args.pages, args.user_id)
+        while True:
+            started = time.perf_counter()
+            items = next(pages, None)
+            query += time.perf_counter() - started
+            if items is None:
+                break
+            started = time.perf_counter()
+            bodies.append(serialize(items, args.size))
+            encode += time.perf_counter() - started
+    rows = args.size * args.pages * args.repeat
+    print(
+        f"{name:<16} query {rows / query:9.0f} rows/s  "
+        f"serialize {rows / encode:9.0f} rows/s  "
+        f"total {rows / (query + encode):9.0f} rows/s"
+    )
+    return bodies[: args.pages]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--size", type=int, default=200, help="items per page")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    args.pages = min(args.pages, args.rows // args.size)
+
+    tmpdir = tempfile.mkdtemp(prefix="bench-serialize-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmpdir}/unused.db")
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from expenses_api import models  # noqa: F401  (registers the tables)
+    from expenses_api.database import Base
+
+    engine = create_engine(f"sqlite:///{tmpdir}/serialize.db")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine, autoflush=False)() as db:
+        args.user_id = populate(db, args.rows)
+        results = [run(*approach, db, args) for approach in APPROACHES]
+    engine.dispose()
+
+    # all approaches must produce the same body
+    return 0 if all(result == results[0] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Measure the API's cold start: import time and schema setup.
+
+Imports ``expenses_api.main`` in fresh interpreters under ``python -X
+importtime`` and reports the median wall time, the median cumulative import
+time of the app, where it goes per top-level package, and whether modules
+that should stay off the startup path (Faker, passlib, jose) got imported.
+Then times the lifespan's schema check on a new and on an up-to-date
+database, next to the plain ``create_all`` it replaced.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+APP = "expenses_api.main"
+LAZY = ("faker", "passlib", "jose", "cryptography")
+
+
+def import_once() -> tuple:
+    """Return (wall seconds, {module: (self µs, cumulative µs)}) for one run."""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {APP}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = time.perf_counter() - started
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        if own.strip().isdigit():
+            modules[name.strip()] = (int(own), int(cumulative))
+    return wall, modules
+
+
+def measure_imports(runs: int) -> dict:
+    walls, totals, per_package = [], [], defaultdict(list)
+    lazy_loaded: set = set()
+    for _ in range(runs):
+        wall, modules = import_once()
+        walls.append(wall)
+        totals.append(modules[APP][1])
+        packages: dict = defaultdict(int)
+        for name, (own, _) in modules.items():
+            packages[name.split(".")[0]] += own
+            if name.split(".")[0] in LAZY:
+                lazy_loaded.add(name.split(".")[0])
+        for package, own in packages.items():
+            per_package[package].append(own)
+
+    top = sorted(
+        ((statistics.median(v) / 1000, k) for k, v in per_package.items()),
+        reverse=True,
+    )[:12]
+    return {
+        "runs": runs,
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "app_import_ms": round(statistics.median(totals) / 1000, 1),
+        "top_packages_ms": {name: round(ms, 1) for ms, name in top},
+        "lazy_modules_loaded": sorted(lazy_loaded),
+    }
+
+
+def measure_schema() -> dict:
+    from sqlalchemy import create_engine
+
+    from expenses_api import migrations
+    from expenses_api.database import Base
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'startup.db')}")
+
+        def timed(fn):
+            started = time.perf_counter()
+            fn()
+            return round((time.perf_counter() - started) * 1000, 2)
+
+        result = {
+            "check_new_db_ms": timed(lambda: migrations.check(engine)),
+            "check_up_to_date_ms": timed(lambda: migrations.check(engine)),
+            "create_all_existing_db_ms": timed(
+                lambda: Base.metadata.create_all(bind=engine)
+            ),
+        }
+        engine.dispose()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    results = {"imports": measure_imports(args.runs), "schema": measure_schema()}
+    imports = results["imports"]
+    print(
+        f"import {APP}: {imports['app_import_ms']} ms "
+        f"(interpreter wall {imports['wall_ms']} ms, median of {args.runs})"
+    )
+    for name, ms in imports["top_packages_ms"].items():
+        print(f"  {name:<24} {ms:>8.1f} ms")
+    print(
+        f"  lazy modules imported: {', '.join(imports['lazy_modules_loaded']) or 'none'}"
+    )
+    for name, ms in results["schema"].items():
+        print(f"{name:<28} {ms} ms")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+    return 1 if imports["lazy_modules_loaded"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,352 @@
+"""Load-test and micro-benchmark harness for the API.
+
+Seeds a SQLite database with Faker data at the requested scale (reused on
+later runs), then drives the routers in-process through httpx and calls the
+``crud.summary_*`` functions directly. Every scenario reports p50/p95/p99
+latency, throughput and the process peak RSS, and the whole run is written
+to JSON. Given a baseline JSON, the run exits non-zero when a scenario's p95
+grows, or its throughput drops, by more than ``--threshold``.
+
+    python benchmarks/harness.py --scale 10k --output results.json
+    python benchmarks/harness.py --scale 10k --baseline results.json
+    python benchmarks/harness.py --scale 1m --requests 2000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+USERNAME, PASSWORD = "bench", "benchpass123"
+
+
+def parse_scale(value: str) -> int:
+    try:
+        return SCALES.get(value.lower()) or int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected one of {sorted(SCALES)} or a row count"
+        )
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+# ---------------------------------------------------------------- data
+
+
+def populate(rows: int, workers: int, user_id: int) -> None:
+    """Seed ``rows`` Faker expenses for ``user_id`` unless they already exist."""
+    import contextlib
+
+    from sqlalchemy import func, select
+
+    from expenses_api.database import SessionLocal
+    from expenses_api.models import Expense
+    from expenses_api.seed import seed_faker
+
+    with SessionLocal() as db:
+        owned = select(func.count()).where(Expense.user_id == user_id)
+        if db.scalar(owned) == rows:
+            return
+    # seed.py reports on stdout, which may be carrying the results JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        seed_faker(rows, batch=20_000, workers=workers, user_id=user_id)
+
+
+def create_user() -> int:
+    from sqlalchemy import select
+
+    from expenses_api.database import SessionLocal
+    from expenses_api.models import User
+    from expenses_api.security import get_password_hash
+
+    with SessionLocal() as db:
+        user_id = db.scalar(select(User.id).where(User.username == USERNAME))
+        if user_id is None:
+            user = User(username=USERNAME, hashed_password=get_password_hash(PASSWORD))
+            db.add(user)
+            db.commit()
+            user_id = user.id
+        return user_id
+
+
+# ---------------------------------------------------------------- measuring
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+
+    def pct(p):
+        if not ordered:
+            return None
+        return round(
+            ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3
+        )
+
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else None,
+        "throughput": round(len(ordered) / elapsed, 2) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def drive(operation, requests: int, concurrency: int) -> dict:
+    """Run ``operation(i)`` ``requests`` times from ``concurrency`` workers."""
+    latencies, errors = [], 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            started = time.perf_counter()
+            ok = await operation(i)
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def measure_sync(fn, requests: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, 0, time.perf_counter() - started)
+
+
+# ---------------------------------------------------------------- scenarios
+
+
+async def http_scenarios(args, results: dict) -> None:
+    import httpx
+    from sqlalchemy import func, select
+
+    from expenses_api.database import SessionLocal
+    from expenses_api.main import app
+    from expenses_api.models import Category, Expense
+
+    with SessionLocal() as db:
+        max_id = db.scalar(select(func.max(Expense.id)))
+        category_ids = list(db.scalars(select(Category.id)))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        login = {"username": USERNAME, "password": PASSWORD}
+        token = (await client.post("/auth/token", data=login)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        created: list = []
+        cursor = [None]
+
+        async def auth_token(i):
+            return (await client.post("/auth/token", data=login)).is_success
+
+        async def categories_list(i):
+            return (await client.get("/categories", headers=headers)).is_success
+
+        async def expenses_list(i):
+            page = 1 + i % 20
+            params = {"page": page, "size": 50}
+            return (
+                await client.get("/expenses", params=params, headers=headers)
+            ).is_success
+
+        async def expenses_list_cursor(i):
+            params = {"size": 50}
+            if cursor[0]:
+                params["cursor"] = cursor[0]
+            response = await client.get("/expenses", params=params, headers=headers)
+            cursor[0] = response.json()["next_cursor"] if response.is_success else None
+            return response.is_success
+
+        async def expenses_get(i):
+            expense_id = random.randint(1, max_id)
+            response = await client.get(f"/expenses/{expense_id}", headers=headers)
+            return response.status_code in (200, 404)
+
+        async def expenses_create(i):
+            body = {
+                "category_id": random.choice(category_ids),
+                "amount": str(Decimal(random.randint(500, 50_000)) / 100),
+                "currency": "EUR",
+                "name": "benchmark",
+            }
+            response = await client.post("/expenses", json=body, headers=headers)
+            if response.is_success:
+                created.append(response.json()["id"])
+            return response.is_success
+
+        async def expenses_delete(i):
+            if not created:
+                return False
+            response = await client.delete(
+                f"/expenses/{created.pop()}", headers=headers
+            )
+            return response.is_success
+
+        scenarios = {
+            # argon2 dominates, so logins get a smaller share of the budget
+            "auth_token": (auth_token, max(1, args.requests // 10)),
+            "categories_list": (categories_list, args.requests),
+            "expenses_list": (expenses_list, args.requests),
+            "expenses_list_cursor": (expenses_list_cursor, args.requests),
+            "expenses_get": (expenses_get, args.requests),
+            "expenses_create": (expenses_create, args.requests),
+            "expenses_delete": (expenses_delete, args.requests),
+        }
+        for name, (operation, requests) in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            # the cursor walk is sequential by nature
+            concurrency = 1 if name == "expenses_list_cursor" else args.concurrency
+            results[name] = await drive(operation, requests, concurrency)
+            report(name, results[name])
+
+
+def summary_scenarios(args, results: dict, user_id: int) -> None:
+    from expenses_api import crud
+    from expenses_api.database import SessionLocal
+
+    month_ago = datetime.now(timezone.utc) - timedelta(days=30)
+    calls = {
+        "summary_by_category": lambda db: crud.summary_by_category(db, user_id=user_id),
+        "summary_by_month": lambda db: crud.summary_by_month(db, user_id=user_id),
+        "summary_by_day": lambda db: crud.summary_by_day(
+            db, from_dt=month_ago, user_id=user_id
+        ),
+        "summary_by_currency": lambda db: crud.summary_by_currency(db, user_id=user_id),
+        "summary_by_category_range": lambda db: crud.summary_by_category(
+            db, from_dt=month_ago, user_id=user_id
+        ),
+    }
+    requests = max(1, args.requests // 10)
+    with SessionLocal() as db:
+        for name, call in calls.items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = measure_sync(lambda call=call: call(db), requests)
+            report(name, results[name])
+
+
+# ---------------------------------------------------------------- reporting
+
+
+def report(name: str, stats: dict) -> None:
+    print(
+        f"{name:<28} n={stats['count']:<6} err={stats['errors']:<4} "
+        f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms "
+        f"{stats['throughput']}/s rss={stats['peak_rss_mb']}MB",
+        file=sys.stderr,
+    )
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if base.get("p95_ms") and stats["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {stats['p95_ms']}ms")
+        if base.get("throughput") and stats["throughput"] < base["throughput"] * (
+            1 - threshold
+        ):
+            regressions.append(
+                f"{name}: throughput {base['throughput']}/s -> {stats['throughput']}/s"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=parse_scale, default=SCALES["10k"])
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--db", help="SQLite file to seed/reuse (default: per scale in tmp)"
+    )
+    parser.add_argument("--only", nargs="*", help="scenario names to run")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed regression"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="seeding processes")
+    parser.add_argument("--seed", type=int, default=1234, help="random seed")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    # Settings are read at import time, so the database is chosen up front.
+    path = args.db or os.path.join(
+        tempfile.gettempdir(), f"expenses-bench-{args.scale}.db"
+    )
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("DEBUG", "false")
+
+    from expenses_api import migrations
+    from expenses_api.database import engine
+
+    # the same schema, version rows included, that the app would create
+    migrations.migrate(engine)
+    # the data belongs to the bench user, who only sees their own
+    user_id = create_user()
+    populate(args.scale, args.workers, user_id)
+
+    results: dict = {}
+    asyncio.run(http_scenarios(args, results))
+    summary_scenarios(args, results, user_id)
+
+    run = {
+        "meta": {
+            "scale": args.scale,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(run, fh, indent=2)
+    else:
+        json.dump(run, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,2 +1,8 @@
-def main() -> None:
-    __all__ = ["main"]
+def main(argv=None) -> None:
+    """``expenses-api`` console script; the CLI is imported only when run."""
+    from .cli import main as run
+
+    run(argv)
+
+
+__all__ = ["main"]
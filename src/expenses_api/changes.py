@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from . import versions
+from .models import Expense, ExpenseChange
+
+# Change log behind GET /expenses/changes. Expense writes record their
+# changes in the same transaction, each under a new seq. seqs only grow and,
+# with SQLite's single writer, follow commit order, so "everything after the
+# last seq I saw" is a complete feed.
+#
+# Only the latest change of an expense is kept: the log holds one upsert per
+# live expense and one tombstone per deleted one. It grows with the data,
+# not with the write volume, and a feed from seq 0 is a full sync. Tombstones
+# are compacted after a retention period; a client whose watermark is older
+# than the compaction horizon may have missed deletions and has to resync
+# from 0.
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+_logged_columns = ["expense_id", "user_id", "op"]
+
+
+@dataclass
+class Feed:
+    items: list
+    # the seq to pass as ``since`` next time
+    next_since: int
+    has_more: bool = False
+
+
+def check_since(db: Session, since: int) -> None:
+    """Raise ValueError("expired") for a watermark older than the horizon.
+
+    0 is always valid: a client starting from scratch has nothing to delete.
+    """
+    horizon = versions.read(db, versions.CHANGES_HORIZON)[versions.CHANGES_HORIZON]
+    if 0 < since < horizon.version:
+        raise ValueError("expired")
+
+
+def _replace(db: Session, expense_ids: List[int]) -> None:
+    db.execute(delete(ExpenseChange).where(ExpenseChange.expense_id.in_(expense_ids)))
+
+
+def record_upserts(db: Session, expense_ids: Iterable[int]) -> None:
+    """Log the given (flushed) expenses as created or changed."""
+    expense_ids = list(expense_ids)
+    _replace(db, expense_ids)
+    db.execute(
+        insert(ExpenseChange).from_select(
+            _logged_columns,
+            select(Expense.id, Expense.user_id, literal(UPSERT))
+            .where(Expense.id.in_(expense_ids))
+            .order_by(Expense.id),
+        )
+    )
+
+
+def record_deletion(db: Session, expense_id: int, user_id: Optional[int]) -> None:
+    _replace(db, [expense_id])
+    db.execute(
+        insert(ExpenseChange).values(expense_id=expense_id, user_id=user_id, op=DELETE)
+    )
+
+
+def backfill(db: Session, batch_size: int = 5000) -> int:
+    """Log an upsert for every expense missing from the log.
+
+    For expenses written around the API (seed, manual SQL). Works through
+    the table by id range, one transaction per batch.
+    """
+    logged = 0
+    last_id = 0
+    max_id = db.scalar(select(func.max(Expense.id))) or 0
+    while last_id < max_id:
+        unlogged = (
+            select(Expense.id, Expense.user_id, literal(UPSERT))
+            .where(
+                Expense.id > last_id,
+                Expense.id <= last_id + batch_size,
+                ~select(ExpenseChange.seq)
+                .where(ExpenseChange.expense_id == Expense.id)
+                .exists(),
+            )
+            .order_by(Expense.id)
+        )
+        logged += db.execute(
+            insert(ExpenseChange).from_select(_logged_columns, unlogged)
+        ).rowcount
+        db.commit()
+        last_id += batch_size
+    return logged
+
+
+def clear(db: Session) -> None:
+    """Empty the log after expenses were replaced wholesale.
+
+    Every watermark handed out so far expires, so clients resync from 0.
+    """
+    last = db.scalar(select(func.max(ExpenseChange.seq)))
+    db.execute(delete(ExpenseChange))
+    if last is not None:
+        versions.advance(db, versions.CHANGES_HORIZON, last + 1)
+
+
+def compact(db: Session, older_than: timedelta) -> int:
+    """Drop tombstones older than ``older_than``; returns how many."""
+    cutoff = datetime.now(timezone.utc) - older_than
+    horizon = db.scalar(
+        select(func.max(ExpenseChange.seq)).where(
+            ExpenseChange.op == DELETE, ExpenseChange.changed_at < cutoff
+        )
+    )
+    if horizon is None:
+        return 0
+    removed = db.execute(
+        delete(ExpenseChange).where(
+            ExpenseChange.op == DELETE, ExpenseChange.seq <= horizon
+        )
+    ).rowcount
+    versions.advance(db, versions.CHANGES_HORIZON, horizon)
+    db.commit()
+    return removed
@@ -0,0 +1,139 @@
+import argparse
+import logging
+
+
+def _migrate(args) -> None:
+    from . import migrations
+    from .database import engine
+
+    if args.status:
+        version = migrations.current_version(engine)
+        print(f"database: {version if version is not None else 'untracked'}")
+        print(f"code:     {migrations.HEAD}")
+        return
+    applied = migrations.migrate(engine, args.to)
+    print(f"Applied {len(applied)} migration(s).")
+    if args.assign_owner:
+        from sqlalchemy import select
+
+        from .models import User
+
+        with engine.connect() as connection:
+            user_id = connection.scalar(
+                select(User.id).where(User.username == args.assign_owner)
+            )
+        if user_id is None:
+            raise SystemExit(f"no such user: {args.assign_owner}")
+        categories, expenses = migrations.assign_owner(engine, user_id)
+        print(
+            f"Gave {categories} categories and {expenses} expenses "
+            f"to {args.assign_owner}."
+        )
+
+
+def _seed(args) -> None:
+    from . import seed
+
+    try:
+        seed.main(args.args)
+    except ImportError as exc:
+        if exc.name != "faker":
+            raise
+        raise SystemExit("seeding needs Faker: install expenses-api[seed]") from None
+
+
+def _rebuild_rollups(args) -> None:
+    from . import rollups
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        print(f"Rebuilt {rollups.rebuild(db)} rollup buckets.")
+
+
+def _rebuild_search(args) -> None:
+    from . import search
+    from .database import engine
+
+    with engine.begin() as connection:
+        search.create(connection)
+        search.rebuild(connection)
+    print("Rebuilt the expense name index.")
+
+
+def _compact_changes(args) -> None:
+    from datetime import timedelta
+
+    from . import changes
+    from .database import SessionLocal
+    from .settings import settings
+
+    days = settings.CHANGES_RETENTION_DAYS if args.days is None else args.days
+    with SessionLocal() as db:
+        removed = changes.compact(db, timedelta(days=days))
+    print(f"Removed {removed} tombstone(s).")
+
+
+def _load_fx(args) -> None:
+    from . import fx
+
+    fx.main(args.args)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="expenses-api", description="Expenses API maintenance commands"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="apply pending schema migrations")
+    migrate.add_argument("--to", type=int, help="stop after this version")
+    migrate.add_argument(
+        "--status", action="store_true", help="show the versions and exit"
+    )
+    migrate.add_argument(
+        "--assign-owner",
+        metavar="USERNAME",
+        help="then give data from before owners existed to this user",
+    )
+    migrate.set_defaults(run=_migrate)
+
+    # seed and load-fx hand their arguments (and --help) to their own parsers
+    seed = commands.add_parser(
+        "seed",
+        help="fill the database with fake data (see seed --help)",
+        add_help=False,
+    )
+    seed.set_defaults(run=_seed, passthrough=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-rollups", help="recompute expense_rollups from expenses"
+    )
+    rebuild.set_defaults(run=_rebuild_rollups)
+
+    rebuild_search = commands.add_parser(
+        "rebuild-search", help="re-index expense names for ?q= search"
+    )
+    rebuild_search.set_defaults(run=_rebuild_search)
+
+    compact = commands.add_parser(
+        "compact-changes", help="drop old deletions from the sync change log"
+    )
+    compact.add_argument(
+        "--days",
+        type=float,
+        default=None,
+        help="keep this many days of deletions (default: CHANGES_RETENTION_DAYS)",
+    )
+    compact.set_defaults(run=_compact_changes)
+
+    load_fx = commands.add_parser(
+        "load-fx", help="load exchange rates from CSV", add_help=False
+    )
+    load_fx.set_defaults(run=_load_fx, passthrough=True)
+
+    args, extra = parser.parse_known_args(argv)
+    if extra and not getattr(args, "passthrough", False):
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.args = extra
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args.run(args)
@@ -1,33 +1,155 @@
 from typing import List, Optional, Tuple
-from sqlalchemy import func, select, text
+from sqlalchemy import (
+    Date,
+    String,
+    func,
+    insert,
+    inspect,
+    literal_column,
+    select,
+    tuple_,
+    type_coerce,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .models import Category, Expense
+from .models import (
+    Category,
+    Expense,
+    ExpenseChange,
+    ExpenseRollup,
+    User,
+    normalize_category_name,
+)
+from . import changes, fx, rollups, search, versions
+from .caching import VersionedCache
+from .instrumentation import register_cache
+from .pagination import (
+    NEXT,
+    PREV,
+    Page,
+    cache_key,
+    count_cache,
+    decode_cursor,
+    encode_cursor,
+)
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timezone
+from .settings import settings
 
 
 from expenses_api import models
 
+# The implementation of the user logic
+
+
+def get_user_by_username(db: Session, username: str) -> Optional[User]:
+    return db.execute(select(User).where(User.username == username)).scalar()
+
+
+def create_user(db: Session, username: str, hashed_password: str) -> User:
+    user = User(username=username, hashed_password=hashed_password)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def set_password_hash(db: Session, user_id: int, hashed_password: str) -> None:
+    user = db.get(User, user_id)
+    user.hashed_password = hashed_password
+    db.commit()
+
+
 # The implementation of the category logic
 
 
-def create_category(db: Session, name: str) -> Category:
-    category = Category(name=name)
+# Owner scoping: crud functions take an optional ``user_id``. The routers
+# always pass the current user's; None means no owner filter, for scripts.
+
+
+def get_category_by_name(
+    db: Session, name: str, user_id: Optional[int] = None
+) -> Optional[Category]:
+    """Case-insensitive lookup among ``user_id``'s categories (None: ownerless).
+
+    Matches the expression of the owner/name unique index, which serves it;
+    the 0 is inlined because SQLite only matches an identical expression.
+    """
+    return db.execute(
+        select(Category).where(
+            func.coalesce(Category.user_id, literal_column("0")) == (user_id or 0),
+            Category.normalized_name == normalize_category_name(name),
+        )
+    ).scalar()
+
+
+def create_category(db: Session, name: str, user_id: Optional[int] = None) -> Category:
+    """Raises ValueError if the owner already has this name (any case)."""
+    if get_category_by_name(db, name, user_id) is not None:
+        raise ValueError("category exists")
+    category = Category(
+        name=name, normalized_name=normalize_category_name(name), user_id=user_id
+    )
     db.add(category)
+    try:
+        db.flush()
+    except IntegrityError:
+        # a concurrent insert won between the check and the flush
+        db.rollback()
+        raise ValueError("category exists")
+    versions.bump(db, versions.CATEGORIES)
     db.commit()
     db.refresh(category)
     return category
 
 
-def list_categories(db: Session) -> List[Category]:
-    return db.execute(select(Category).order_by(Category.name)).scalars().all()
+# Category lists per owner, kept per worker. Every category write bumps the
+# categories stamp in the same transaction, so a read compares the cached
+# list's stamp with the current one (a primary key lookup) and any worker's
+# write is seen on the next read.
+category_cache = VersionedCache(settings.CATEGORY_CACHE_MAX_SIZE)
+register_cache("category_cache", category_cache)
 
 
-def delete_category(db: Session, category_id: int) -> None:
+def list_categories(db: Session, user_id: Optional[int] = None) -> list:
+    """Categories ordered by name, as read-only rows of id, name, created_at.
+
+    Rows rather than entities, so one list can be shared between sessions.
+    """
+    # the stamp is read first: a write landing in between makes the next
+    # read miss, never serves a list older than its stamp
+    version = versions.read(db, versions.CATEGORIES)[versions.CATEGORIES].version
+    categories = category_cache.get(user_id, version)
+    if categories is None:
+        q = select(Category.id, Category.name, Category.created_at).order_by(
+            Category.name
+        )
+        if user_id is not None:
+            q = q.where(Category.user_id == user_id)
+        categories = tuple(db.execute(q))
+        category_cache.set(user_id, version, categories)
+    return list(categories)
+
+
+def get_category(
+    db: Session, category_id: int, user_id: Optional[int] = None
+) -> Optional[Category]:
     category = db.get(Category, category_id)
+    if category is not None and user_id is not None and category.user_id != user_id:
+        return None
+    return category
+
+
+def delete_category(
+    db: Session, category_id: int, user_id: Optional[int] = None
+) -> None:
+    category = get_category(db, category_id, user_id)
     if not category:
         return None
     db.delete(category)
+    versions.bump(db, versions.CATEGORIES)
     db.commit()
     return f"Category {category_id} deleted successfully!"
 
@@ -41,26 +163,126 @@ def create_expense(
     amount: Decimal,
     currency: str,
     name: Optional[str] = None,
+    user_id: Optional[int] = None,
 ) -> Expense:
+    """``user_id`` defaults to the category's owner."""
+    if user_id is None:
+        category = db.get(Category, category_id)
+        user_id = category.user_id if category is not None else None
     expense = Expense(
-        category_id=category_id, amount=amount, currency=currency.upper(), name=name
+        category_id=category_id,
+        amount=amount,
+        currency=currency.upper(),
+        name=name,
+        user_id=user_id,
     )
     db.add(expense)
+    db.flush()
+    rollups.apply(db, [expense.id])
+    changes.record_upserts(db, [expense.id])
+    versions.bump(db, versions.EXPENSES)
     db.commit()
+    count_cache.invalidate()
     db.refresh(expense)
     return expense
 
 
-def get_expense(db: Session, expense_id: int) -> Optional[Expense]:
-    return db.get(Expense, expense_id)
+def existing_category_ids(
+    db: Session, category_ids, user_id: Optional[int] = None
+) -> set:
+    q = select(Category.id).where(Category.id.in_(set(category_ids)))
+    if user_id is not None:
+        q = q.where(Category.user_id == user_id)
+    return set(db.execute(q).scalars())
 
 
-def delete_expense(db: Session, expense_id: int) -> None:
+def bulk_create_expenses(
+    db: Session, rows: List[dict], user_id: Optional[int] = None
+) -> List[int]:
+    """Insert already validated rows in one transaction, ids in input order.
+
+    Rows go through a single multi-row INSERT ... RETURNING and are folded
+    into the rollups as a set, so the cost per row is a fraction of
+    ``create_expense``.
+    """
+    if not rows:
+        return []
+    # sort_by_parameter_order would degrade to one statement per row on
+    # SQLite; rows of one INSERT get ascending rowids in VALUES order, so
+    # sorting the returned ids restores input order instead.
+    ids = sorted(
+        db.execute(
+            insert(Expense).returning(Expense.id),
+            [
+                {**row, "currency": row["currency"].upper(), "user_id": user_id}
+                for row in rows
+            ],
+        ).scalars()
+    )
+    rollups.apply(db, ids)
+    changes.record_upserts(db, ids)
+    versions.bump(db, versions.EXPENSES)
+    db.commit()
+    count_cache.invalidate()
+    return ids
+
+
+def get_expense(
+    db: Session, expense_id: int, user_id: Optional[int] = None
+) -> Optional[Expense]:
     expense = db.get(Expense, expense_id)
+    if expense is not None and user_id is not None and expense.user_id != user_id:
+        return None
+    return expense
+
+
+def get_expenses(
+    db: Session, expense_ids, user_id: Optional[int] = None
+) -> Tuple[List[Expense], List[int]]:
+    """Several expenses at once: (found, in request order; missing ids).
+
+    Expenses already loaded in the session are taken from its identity map;
+    the rest are read with a single IN query. Ids of other users' expenses
+    are reported as missing.
+    """
+    wanted = list(dict.fromkeys(expense_ids))
+    found = {}
+    for expense_id in wanted:
+        expense = db.identity_map.get(db.identity_key(Expense, expense_id))
+        if expense is not None and not inspect(expense).expired:
+            found[expense_id] = expense
+    unloaded = [expense_id for expense_id in wanted if expense_id not in found]
+    if unloaded:
+        found.update(
+            (expense.id, expense)
+            for expense in db.scalars(select(Expense).where(Expense.id.in_(unloaded)))
+        )
+    items = [
+        found[expense_id]
+        for expense_id in wanted
+        if expense_id in found
+        and (user_id is None or found[expense_id].user_id == user_id)
+    ]
+    owned = {expense.id for expense in items}
+    return items, [expense_id for expense_id in wanted if expense_id not in owned]
+
+
+def delete_expense(db: Session, expense_id: int, user_id: Optional[int] = None) -> None:
+    expense = get_expense(db, expense_id, user_id)
     if not expense:
         return None
+    old = rollups.snapshot(db, expense_id)
+    if old is None:
+        # deleted by someone else in the meantime
+        db.commit()
+        return None
+    changes.record_deletion(db, expense_id, expense.user_id)
     db.delete(expense)
+    db.flush()
+    rollups.retract(db, old)
+    versions.bump(db, versions.EXPENSES)
     db.commit()
+    count_cache.invalidate()
     return None
 
 
@@ -69,68 +291,504 @@ def update_expense(
     expense_id: int,
     patch: dict,
     expected_updated_at: Optional[datetime] = None,
-) -> Expense:
-    exp = db.get(Expense, expense_id)
-    if not exp:
+    user_id: Optional[int] = None,
+) -> Optional[Expense]:
+    """Apply ``patch`` in one conditional UPDATE ... RETURNING.
+
+    Ownership and the optimistic version check are part of the WHERE clause,
+    so no concurrent write can slip in between check and write. The rollup
+    snapshot before it is a second, no-op UPDATE in the same transaction.
+    Returns None
+    when the expense does not exist (for this user) and raises
+    ValueError("conflict") when ``expected_updated_at`` is no longer current.
+    """
+    # holds the write lock from here on, If-Match or not
+    old = rollups.snapshot(db, expense_id)
+    if old is None or (user_id is not None and old.user_id != user_id):
+        db.commit()  # nothing changed; releases the lock
         return None
-    # optimistic concurrency
+    if "currency" in patch:
+        patch = {**patch, "currency": patch["currency"].upper()}
+    stmt = update(Expense).where(Expense.id == expense_id)
+    if user_id is not None:
+        stmt = stmt.where(Expense.user_id == user_id)
     if expected_updated_at is not None:
-        if exp.updated_at is None or exp.updated_at.replace(
-            tzinfo=None
-        ) != expected_updated_at.replace(tzinfo=None):
-            raise ValueError("conflict")
-    for k, v in patch.items():
-        setattr(exp, k, v)
+        stmt = stmt.where(_updated_at_key.in_(_stored_versions(expected_updated_at)))
+    # microseconds, unlike CURRENT_TIMESTAMP, so back-to-back updates still
+    # get distinct versions
+    stmt = stmt.values(**patch, updated_at=datetime.now(timezone.utc))
+    expense = db.scalars(
+        stmt.returning(Expense).execution_options(populate_existing=True)
+    ).one_or_none()
+    if expense is None:
+        db.commit()
+        raise ValueError("conflict")
+    rollups.retract(db, old)
+    rollups.apply(db, [expense_id])
+    changes.record_upserts(db, [expense_id])
+    versions.bump(db, versions.EXPENSES)
     db.commit()
-    db.refresh(exp)
-    return exp
+    count_cache.invalidate()
+    return expense
 
 
-def list_expenses(
-    db: Session,
-    page: int = 1,
-    size: int = 50,
+# Raw stored value of created_at: keyset comparisons must match the text the
+# database orders by, not a re-rendered datetime.
+_created_at_key = type_coerce(Expense.created_at, String)
+
+
+def _as_stored(dt: datetime) -> str:
+    """Render a bound the way SQLite stores created_at (naive UTC text)."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    if dt.microsecond:
+        return dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+_updated_at_key = type_coerce(Expense.updated_at, String)
+
+
+def _stored_versions(dt: datetime) -> List[str]:
+    """Texts an updated_at of ``dt`` can be stored as.
+
+    Server-side CURRENT_TIMESTAMP has no fraction; values written through
+    SQLAlchemy always carry six digits.
+    """
+    stored = _as_stored(dt)
+    return [stored] if dt.microsecond else [stored, stored + ".000000"]
+
+
+def _filter_expenses(
+    q,
+    user_id: Optional[int] = None,
     from_dt: Optional[datetime] = None,
     to_dt: Optional[datetime] = None,
     category_id: Optional[int] = None,
     min_amount: Optional[Decimal] = None,
     max_amount: Optional[Decimal] = None,
-) -> Tuple[List[Expense], int]:
-    q = select(Expense)
+    search_text: Optional[str] = None,
+):
+    # the owner leads every expenses index, so it goes first
+    if user_id is not None:
+        q = q.where(Expense.user_id == user_id)
+    # [from_dt, to_dt) as raw-text bounds, so SQLite can range-scan the
+    # created_at indexes (alone, or after category_id)
+    if from_dt is not None:
+        q = q.where(_created_at_key >= _as_stored(from_dt))
+    if to_dt is not None:
+        q = q.where(_created_at_key < _as_stored(to_dt))
     if category_id:
         q = q.where(Expense.category_id == category_id)
     if min_amount:
         q = q.where(Expense.amount >= min_amount)
     if max_amount:
         q = q.where(Expense.amount <= max_amount)
+    if search_text is not None:
+        q = q.where(Expense.id.in_(_matching_ids(search_text)))
+    return q
 
-    total = db.execute(select(func.count()).select_from(q.subquery())).scalar_one()
-    items = db.execute(q).scalars().all()
-    return items, total
+
+def _matching_ids(search_text: str):
+    return select(search.fts.c.rowid).where(
+        search.fts.c.name.match(search.match_expression(search_text))
+    )
+
+
+# What the list and export endpoints return of an expense, as plain columns.
+EXPENSE_COLUMNS = [
+    "id",
+    "category_id",
+    "amount",
+    "currency",
+    "name",
+    "created_at",
+    "updated_at",
+]
+_expense_columns = [Expense.__table__.c[name] for name in EXPENSE_COLUMNS]
+
+
+def count_expenses(db: Session, **filters) -> int:
+    key = cache_key(**filters)
+    total = count_cache.get(key)
+    if total is None:
+        q = _filter_expenses(select(func.count()).select_from(Expense), **filters)
+        total = db.execute(q).scalar_one()
+        count_cache.set(key, total)
+    return total
 
 
-def summary_by_category(db: Session):
+def paginate_expenses(
+    db: Session,
+    size: int = 50,
+    page: int = 1,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    **filters,
+) -> Page:
+    """Newest-first page of expenses.
+
+    With ``cursor`` the page is cut by keyset on (created_at, id), otherwise
+    ``page`` is applied as an OFFSET. Items are plain rows of
+    ``EXPENSE_COLUMNS``, not ORM entities: list endpoints only serialize
+    them, so identity-map bookkeeping would be wasted. With ``search_text``
+    the page holds the best matches instead, see ``_ranked_page``. Raises
+    ValueError on a malformed cursor or a search without words.
+    """
+    if filters.get("search_text") is not None:
+        if cursor is not None:
+            raise ValueError("search results are paged by page")
+        return _ranked_page(db, size, page, include_total, **filters)
+    q = _filter_expenses(
+        select(*_expense_columns, _created_at_key.label("created_at_key")), **filters
+    )
+    direction = NEXT
+    if cursor is not None:
+        created_at, expense_id, direction = decode_cursor(cursor)
+        key = tuple_(_created_at_key, Expense.id)
+        if direction == PREV:
+            q = q.where(key > (created_at, expense_id))
+        else:
+            q = q.where(key < (created_at, expense_id))
+    if direction == PREV:
+        q = q.order_by(Expense.created_at.asc(), Expense.id.asc())
+    else:
+        q = q.order_by(Expense.created_at.desc(), Expense.id.desc())
+    if cursor is None and page > 1:
+        q = q.offset((page - 1) * size)
+
+    rows = db.execute(q.limit(size + 1)).all()
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if direction == PREV:
+        rows.reverse()
+
+    result = Page(items=rows)
+    if rows:
+        first, last = rows[0], rows[-1]
+        if has_more or direction == PREV:
+            result.next_cursor = encode_cursor(last.created_at_key, last.id, NEXT)
+        if (direction == PREV and has_more) or (
+            direction == NEXT and (cursor is not None or page > 1)
+        ):
+            result.prev_cursor = encode_cursor(first.created_at_key, first.id, PREV)
+    if include_total:
+        result.total = count_expenses(db, **filters)
+    return result
+
+
+def expense_changes(
+    db: Session, since: int = 0, limit: int = 500, user_id: Optional[int] = None
+) -> changes.Feed:
+    """Changes after seq ``since``, oldest first, from the change log.
+
+    Items are rows of seq, op and expense_id followed by ``EXPENSE_COLUMNS``,
+    which are NULL for deletions. Raises ValueError when ``since`` is older
+    than the compaction horizon.
+    """
+    changes.check_since(db, since)
     q = (
         select(
-            models.Category.name.label("key"),
-            Expense.currency,
-            func.sum(Expense.amount).label("total_amount"),
+            ExpenseChange.seq,
+            ExpenseChange.op,
+            ExpenseChange.expense_id,
+            *_expense_columns,
         )
-        .join(Expense, Expense.category_id == Category.id)
-        .group_by(models.Category.name, Expense.currency)
+        .outerjoin(Expense, Expense.id == ExpenseChange.expense_id)
+        .where(ExpenseChange.seq > since)
     )
+    if user_id is not None:
+        q = q.where(ExpenseChange.user_id == user_id)
+    rows = db.execute(q.order_by(ExpenseChange.seq).limit(limit + 1)).all()
+    feed = changes.Feed(items=rows[:limit], next_since=since)
+    if feed.items:
+        feed.next_since = feed.items[-1].seq
+        feed.has_more = len(rows) > limit
+    return feed
+
+
+def _ranked_page(
+    db: Session, size: int, page: int, include_total: bool, search_text: str, **filters
+) -> Page:
+    """Best matches first (bm25, then newest), paged by OFFSET.
+
+    The full-text index yields the matching ids; the other filters are then
+    checked on each match by primary key.
+    """
+    fts = search.fts
+    q = _filter_expenses(
+        select(*_expense_columns, _created_at_key.label("created_at_key"))
+        .select_from(Expense.__table__.join(fts, fts.c.rowid == Expense.id))
+        .where(fts.c.name.match(search.match_expression(search_text))),
+        **filters,
+    ).order_by(fts.c.rank, Expense.id.desc())
+    result = Page(items=db.execute(q.offset((page - 1) * size).limit(size)).all())
+    if include_total:
+        result.total = count_expenses(db, search_text=search_text, **filters)
+    return result
+
+
+def export_query(**filters):
+    """Plain column rows in (created_at, id) order, walked by the keyset index."""
+    q = select(*_expense_columns).order_by(Expense.created_at, Expense.id)
+    return _filter_expenses(q, **filters)
+
+
+def stream_expenses(db: Session, batch_size: int = 1000, **filters):
+    """Yield lists of rows, holding at most ``batch_size`` rows at a time."""
+    q = export_query(**filters).execution_options(yield_per=batch_size)
+    yield from db.execute(q).partitions()
+
+
+def list_expenses(
+    db: Session,
+    page: int = 1,
+    size: int = 50,
+    from_dt: Optional[datetime] = None,
+    to_dt: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    min_amount: Optional[Decimal] = None,
+    max_amount: Optional[Decimal] = None,
+    user_id: Optional[int] = None,
+    search_text: Optional[str] = None,
+) -> Tuple[list, int]:
+    result = paginate_expenses(
+        db,
+        size=size,
+        page=page,
+        include_total=True,
+        user_id=user_id,
+        from_dt=from_dt,
+        to_dt=to_dt,
+        category_id=category_id,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        search_text=search_text,
+    )
+    return result.items, result.total
+
+
+# Summaries read the expense_rollups buckets, so they cost O(buckets)
+# rather than O(expenses). A date range (or a per-day breakdown) needs finer
+# grain than the monthly buckets and falls back to an indexed range scan.
+
+_SUMMARY_KEYS = {
+    "category": (models.Category.name, models.Category.name),
+    "month": (ExpenseRollup.month, func.strftime("%Y-%m", Expense.created_at)),
+    "day": (None, func.strftime("%Y-%m-%d", Expense.created_at)),
+    "currency": (ExpenseRollup.currency, Expense.currency),
+}
+
+
+def _summary(
+    db: Session,
+    by: str,
+    from_dt: Optional[datetime] = None,
+    to_dt: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    target_currency: Optional[str] = None,
+):
+    rollup_key, expense_key = _SUMMARY_KEYS[by]
+    # conversion needs the day of each amount, which only expenses have
+    use_rollups = from_dt is None and to_dt is None and target_currency is None
+    if rollup_key is not None and use_rollups:
+        source, key, total = ExpenseRollup, rollup_key, ExpenseRollup.total_amount
+    else:
+        source, key, total = Expense, expense_key, Expense.amount
+
+    groups = [key, source.currency]
+    columns = [key.label("key"), source.currency]
+    if target_currency is not None:
+        day = type_coerce(func.date(Expense.created_at), Date)
+        groups.append(day)
+        columns.append(day.label("day"))
+    q = select(*columns, func.sum(total).label("total_amount")).select_from(source)
+    if by == "category":
+        q = q.join(Category, source.category_id == Category.id)
+    if user_id is not None:
+        q = q.where(source.user_id == user_id)
+    if category_id:
+        q = q.where(source.category_id == category_id)
+    if from_dt is not None:
+        q = q.where(_created_at_key >= _as_stored(from_dt))
+    if to_dt is not None:
+        q = q.where(_created_at_key < _as_stored(to_dt))
+    q = q.group_by(*groups)
+    if by in ("month", "day"):
+        q = q.order_by(q.selected_columns.key.desc())
+    if target_currency is not None:
+        try:
+            return fx.convert_totals(db, db.execute(q), target_currency)
+        except ValueError:
+            raise ValueError("missing exchange rate")
     return [dict(r._mapping) for r in db.execute(q).all()]
 
 
-def summary_by_month(db: Session):
-    q = text("""
-        SELECT
-            strftime('%Y-%m', created_at) AS key, 
-            currency,
-            SUM(amount) AS total_amount
-        FROM expenses
-        GROUP BY key, currency
-        ORDER BY key DESC
-    """)
-    rows = db.execute(q).all()
-    return [dict(r._mapping) for r in rows]
+def summary_by_category(db: Session, **filters):
+    return _summary(db, "category", **filters)
+
+
+def summary_by_month(db: Session, **filters):
+    return _summary(db, "month", **filters)
+
+
+def summary_by_day(db: Session, **filters):
+    return _summary(db, "day", **filters)
+
+
+def summary_by_currency(db: Session, **filters):
+    return _summary(db, "currency", **filters)
+
+
+def report_versions(db: Session) -> dict:
+    return versions.read(db, versions.EXPENSES, versions.CATEGORIES, versions.FX_RATES)
+
+
+def supported_currencies(db: Session) -> set:
+    return fx.supported_currencies(db)
+
+
+# Async entry points. Each one runs the sync implementation above on an
+# AsyncSession through run_sync, so queries are awaited on the async driver
+# without blocking the event loop and the logic lives in one place.
+
+
+async def aget_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    return await db.run_sync(get_user_by_username, username)
+
+
+async def acreate_user(db: AsyncSession, username: str, hashed_password: str) -> User:
+    return await db.run_sync(create_user, username, hashed_password)
+
+
+async def aset_password_hash(
+    db: AsyncSession, user_id: int, hashed_password: str
+) -> None:
+    return await db.run_sync(set_password_hash, user_id, hashed_password)
+
+
+async def acreate_category(
+    db: AsyncSession, name: str, user_id: Optional[int] = None
+) -> Category:
+    return await db.run_sync(create_category, name, user_id)
+
+
+async def alist_categories(db: AsyncSession, user_id: Optional[int] = None) -> list:
+    return await db.run_sync(list_categories, user_id)
+
+
+async def aget_category(
+    db: AsyncSession, category_id: int, user_id: Optional[int] = None
+) -> Optional[Category]:
+    return await db.run_sync(get_category, category_id, user_id)
+
+
+async def adelete_category(
+    db: AsyncSession, category_id: int, user_id: Optional[int] = None
+) -> None:
+    return await db.run_sync(delete_category, category_id, user_id)
+
+
+async def acreate_expense(
+    db: AsyncSession,
+    category_id: int,
+    amount: Decimal,
+    currency: str,
+    name: Optional[str] = None,
+    user_id: Optional[int] = None,
+) -> Expense:
+    return await db.run_sync(
+        create_expense, category_id, amount, currency, name, user_id
+    )
+
+
+async def aexisting_category_ids(
+    db: AsyncSession, category_ids, user_id: Optional[int] = None
+) -> set:
+    return await db.run_sync(existing_category_ids, category_ids, user_id)
+
+
+async def abulk_create_expenses(
+    db: AsyncSession, rows: List[dict], user_id: Optional[int] = None
+) -> List[int]:
+    return await db.run_sync(bulk_create_expenses, rows, user_id)
+
+
+async def aget_expense(
+    db: AsyncSession, expense_id: int, user_id: Optional[int] = None
+) -> Optional[Expense]:
+    return await db.run_sync(get_expense, expense_id, user_id)
+
+
+async def aget_expenses(
+    db: AsyncSession, expense_ids, user_id: Optional[int] = None
+) -> Tuple[List[Expense], List[int]]:
+    return await db.run_sync(get_expenses, expense_ids, user_id)
+
+
+async def aexpense_changes(db: AsyncSession, **kwargs) -> changes.Feed:
+    return await db.run_sync(expense_changes, **kwargs)
+
+
+async def adelete_expense(
+    db: AsyncSession, expense_id: int, user_id: Optional[int] = None
+) -> None:
+    return await db.run_sync(delete_expense, expense_id, user_id)
+
+
+async def aupdate_expense(
+    db: AsyncSession,
+    expense_id: int,
+    patch: dict,
+    expected_updated_at: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+) -> Optional[Expense]:
+    return await db.run_sync(
+        update_expense, expense_id, patch, expected_updated_at, user_id
+    )
+
+
+async def acount_expenses(db: AsyncSession, **filters) -> int:
+    return await db.run_sync(count_expenses, **filters)
+
+
+async def apaginate_expenses(db: AsyncSession, **kwargs) -> Page:
+    return await db.run_sync(paginate_expenses, **kwargs)
+
+
+# A generator cannot cross run_sync, so the export streams the async result
+# directly.
+async def astream_expenses(db: AsyncSession, batch_size: int = 1000, **filters):
+    q = export_query(**filters).execution_options(yield_per=batch_size)
+    result = await db.stream(q)
+    async for partition in result.partitions():
+        yield partition
+
+
+async def alist_expenses(db: AsyncSession, **kwargs) -> Tuple[list, int]:
+    return await db.run_sync(list_expenses, **kwargs)
+
+
+async def asummary_by_category(db: AsyncSession, **filters):
+    return await db.run_sync(summary_by_category, **filters)
+
+
+async def asummary_by_month(db: AsyncSession, **filters):
+    return await db.run_sync(summary_by_month, **filters)
+
+
+async def asummary_by_day(db: AsyncSession, **filters):
+    return await db.run_sync(summary_by_day, **filters)
+
+
+async def asummary_by_currency(db: AsyncSession, **filters):
+    return await db.run_sync(summary_by_currency, **filters)
+
+
+async def areport_versions(db: AsyncSession) -> dict:
+    return await db.run_sync(report_versions)
+
+
+async def asupported_currencies(db: AsyncSession) -> set:
+    return await db.run_sync(supported_currencies)
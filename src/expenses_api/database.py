@@ -1,14 +1,66 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from .settings import settings
 from sqlalchemy.orm import declarative_base
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    echo=True,
-    connect_args={"check_same_thread": False}
-    if "sqlite" in settings.DATABASE_URL
-    else {},
-)
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url: str) -> dict:
+    """Keyword arguments shared by the sync and async engines for ``url``."""
+    options = {"echo": settings.DEBUG}
+    if is_sqlite(url):
+        if not make_url(url).drivername.endswith("aiosqlite"):
+            options["connect_args"] = {"check_same_thread": False}
+    else:
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # journal_mode is persistent in the file, the others are per connection.
+    # In-memory databases ignore WAL and keep their "memory" journal.
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
+
+
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+if is_sqlite(settings.DATABASE_URL):
+    event.listen(engine, "connect", set_sqlite_pragmas)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
+
+
+def async_database_url() -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = make_url(settings.DATABASE_URL)
+    if url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
+# Async twin of ``engine`` used by the API routes; the sync engine stays for
+# seed.py, scripts and the tests.
+async_engine = create_async_engine(
+    async_database_url(), **engine_options(async_database_url())
+)
+if is_sqlite(async_database_url()):
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
@@ -1,5 +1,5 @@
-from typing import Generator
-from .database import SessionLocal
+from typing import AsyncGenerator, Generator
+from .database import AsyncSessionLocal, SessionLocal
 
 
 def get_session() -> Generator:
@@ -12,3 +12,15 @@ def get_session() -> Generator:
         raise
     finally:
         db.close()
+
+
+async def get_async_session() -> AsyncGenerator:
+    db = AsyncSessionLocal()
+    try:
+        yield db
+        await db.commit()
+    except:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
@@ -0,0 +1,209 @@
+import argparse
+import bisect
+import csv
+import threading
+from datetime import date
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import versions
+from .instrumentation import register_cache
+from .models import FxRate
+from .settings import settings
+
+# Exchange rates. fx_rates holds, per currency and date, how many units of
+# the currency one FX_BASE_CURRENCY buys; a rate stays in effect until the
+# currency's next date. Days before a currency's first rate use that first
+# rate. Converting between two currencies goes through the base.
+
+
+# --- loading ---
+
+
+def parse_rates(lines: Iterable[str]) -> list:
+    """Read ``date,currency,rate`` CSV rows (with that header) into dicts."""
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None or not {"date", "currency", "rate"} <= set(
+        reader.fieldnames
+    ):
+        raise ValueError("expected a CSV header with date,currency,rate")
+    rows = []
+    for line, record in enumerate(reader, start=2):
+        try:
+            rate_date = date.fromisoformat(record["date"].strip())
+            rate = Decimal(record["rate"].strip())
+        except (AttributeError, ValueError, InvalidOperation):
+            raise ValueError(f"line {line}: invalid date or rate")
+        currency = (record["currency"] or "").strip().upper()
+        if len(currency) != 3 or not currency.isalpha():
+            raise ValueError(f"line {line}: invalid currency {currency!r}")
+        if not rate > 0:
+            raise ValueError(f"line {line}: rate must be positive")
+        rows.append({"currency": currency, "rate_date": rate_date, "rate": rate})
+    return rows
+
+
+def load_rates(db: Session, rows: list) -> int:
+    """Upsert parsed rates and commit; returns the number of rows written."""
+    if rows:
+        stmt = sqlite_insert(FxRate)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["currency", "rate_date"],
+                set_={"rate": stmt.excluded.rate},
+            ),
+            rows,
+        )
+        versions.bump(db, versions.FX_RATES)
+    db.commit()
+    return len(rows)
+
+
+def load_csv(db: Session, path: str) -> int:
+    with open(path, newline="") as fh:
+        return load_rates(db, parse_rates(fh))
+
+
+# --- in-memory table ---
+
+
+class RateTable:
+    """Every rate, per currency in date order, for dated lookups in Python.
+
+    ``current`` revalidates it against the fx_rates write stamp, so a load
+    from any process is seen on the next call at the cost of one primary key
+    lookup.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._dates: Dict[str, list] = {}
+        self._rates: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def current(self, db: Session) -> "RateTable":
+        version = versions.read(db, versions.FX_RATES)[versions.FX_RATES].version
+        with self._lock:
+            if version == self.version:
+                self.hits += 1
+                return self
+            self.misses += 1
+        rows = db.execute(
+            select(FxRate.currency, FxRate.rate_date, FxRate.rate).order_by(
+                FxRate.currency, FxRate.rate_date
+            )
+        )
+        dates: Dict[str, list] = {}
+        rates: Dict[str, list] = {}
+        for currency, rate_date, rate in rows:
+            dates.setdefault(currency, []).append(rate_date)
+            rates.setdefault(currency, []).append(rate)
+        with self._lock:
+            self._dates, self._rates, self.version = dates, rates, version
+        return self
+
+    def currencies(self) -> Set[str]:
+        if not self._rates:
+            return {c.upper() for c in settings.DEFAULT_CURRENCIES}
+        return set(self._rates) | {settings.FX_BASE_CURRENCY}
+
+    def rate_on(self, currency: str, day: date) -> Decimal:
+        """Units of ``currency`` per base unit in effect on ``day``."""
+        if currency == settings.FX_BASE_CURRENCY:
+            return Decimal(1)
+        dates = self._dates.get(currency)
+        if not dates:
+            raise ValueError(f"no rate for {currency}")
+        index = bisect.bisect_right(dates, day) - 1
+        return self._rates[currency][max(index, 0)]
+
+    def convert(self, amount: Decimal, source: str, target: str, day: date) -> Decimal:
+        if source == target:
+            return amount
+        return amount / self.rate_on(source, day) * self.rate_on(target, day)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dates, self._rates, self.version = {}, {}, None
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": sum(len(d) for d in self._dates.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+rate_table = RateTable()
+register_cache("fx_rates", rate_table)
+
+
+def supported_currencies(db: Session) -> Set[str]:
+    return rate_table.current(db).currencies()
+
+
+# --- conversion ---
+
+# ISO 4217 exponents that differ from the usual two decimals
+MINOR_UNITS = {
+    "BHD": 3,
+    "CLP": 0,
+    "ISK": 0,
+    "JOD": 3,
+    "JPY": 0,
+    "KRW": 0,
+    "KWD": 3,
+    "OMR": 3,
+    "TND": 3,
+    "VND": 0,
+}
+
+
+def minor_unit(currency: str) -> Decimal:
+    """Smallest amount of ``currency``, e.g. ``Decimal("0.01")`` for EUR."""
+    return Decimal(1).scaleb(-MINOR_UNITS.get(currency, 2))
+
+
+def convert_totals(db: Session, rows: Iterable, target: str) -> list:
+    """Re-aggregate ``(key, currency, day, total_amount)`` rows in ``target``.
+
+    Each per-day, per-currency subtotal is converted once, so the rate
+    lookups scale with distinct days rather than with expenses. Sums stay in
+    Decimal and each key's total is rounded to the target's minor unit once,
+    at the end. Raises ValueError if a subtotal's currency has no rate.
+    """
+    table = rate_table.current(db)
+    totals: Dict[str, Decimal] = {}
+    for key, currency, day, amount in rows:
+        converted = table.convert(amount, currency, target, day)
+        totals[key] = totals.get(key, 0) + converted
+    unit = minor_unit(target)
+    return [
+        {
+            "key": key,
+            "currency": target,
+            "total_amount": total.quantize(unit, ROUND_HALF_EVEN),
+        }
+        for key, total in totals.items()
+    ]
+
+
+def main(argv=None):
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Load exchange rates from CSV")
+    parser.add_argument("path", help="CSV file with date,currency,rate columns")
+    args = parser.parse_args(argv)
+    with SessionLocal() as db:
+        print(f"Loaded {load_csv(db, args.path)} rates.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+import functools
+import hmac
+import inspect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from fastapi import FastAPI, Header, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .settings import settings
+
+# Opt-in request instrumentation (INSTRUMENTATION_ENABLED). Each request gets
+# a RequestStats in a context variable; SQL cursor events, the auth code and
+# InstrumentedRoute add to it, and the middleware folds it into the metrics
+# served at /metrics and into a Server-Timing response header.
+
+logger = logging.getLogger("expenses_api.sql")
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    sql_seconds: float = 0.0
+    auth_seconds: float = 0.0
+    endpoint_seconds: float = 0.0
+    handler_seconds: float = 0.0
+    # auth spent resolving dependencies, i.e. before the endpoint ran
+    dependency_auth_seconds: float = 0.0
+
+    @property
+    def serialization_seconds(self) -> float:
+        # What the route handler spent outside the endpoint and auth: mostly
+        # response validation and serialization, plus request parsing and
+        # dependency setup/teardown (e.g. the session commit).
+        return max(
+            0.0,
+            self.handler_seconds - self.endpoint_seconds - self.dependency_auth_seconds,
+        )
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+@contextmanager
+def phase(name: str):
+    """Add the block's wall time to ``<name>_seconds`` of the current request."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        attr = f"{name}_seconds"
+        setattr(stats, attr, getattr(stats, attr) + time.perf_counter() - started)
+
+
+# --- metrics registry ---
+
+
+class Metrics:
+    """Minimal Prometheus-style registry: labelled counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict = {}
+        self._histograms: dict = {}
+        self._help: dict = {}
+        self.collectors: list[Callable[[], list]] = []
+
+    def describe(self, name: str, kind: str, text: str) -> None:
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1) -> None:
+        with self._lock:
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets, labels: tuple = ()) -> None:
+        with self._lock:
+            key = (name, labels)
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [
+                    tuple(buckets),
+                    [0] * len(buckets),
+                    0,
+                    0.0,
+                ]
+            for i, bound in enumerate(entry[0]):
+                if value <= bound:
+                    entry[1][i] += 1
+            entry[2] += 1
+            entry[3] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        lines, seen = [], set()
+
+        def header(name):
+            if name not in seen and name in self._help:
+                kind, text = self._help[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+            seen.add(name)
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                header(name)
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            for (name, labels), (bounds, counts, count, total) in sorted(
+                self._histograms.items()
+            ):
+                header(name)
+                for bound, bucket in zip(bounds, counts):
+                    le = labels + (("le", _number(bound)),)
+                    lines.append(f"{name}_bucket{_labels(le)} {bucket}")
+                inf = labels + (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{_labels(inf)} {count}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+        # samples of one family must be contiguous, so group across collectors
+        gauges: dict = {}
+        for collect in self.collectors:
+            for name, labels, value in collect():
+                gauges.setdefault(name, []).append((labels, value))
+        for name, samples in gauges.items():
+            header(name)
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Metrics()
+
+
+metrics.describe(
+    "expenses_api_http_requests_total", "counter", "HTTP requests by route and status."
+)
+metrics.describe(
+    "expenses_api_http_request_duration_seconds",
+    "histogram",
+    "Time to the response start, by route.",
+)
+metrics.describe(
+    "expenses_api_http_phase_seconds_total",
+    "counter",
+    "Request time spent in auth, db, endpoint and serialization.",
+)
+metrics.describe(
+    "expenses_api_db_queries_per_request",
+    "histogram",
+    "SQL statements issued per request; a growing tail hints at an N+1.",
+)
+metrics.describe("expenses_api_cache_size", "gauge", "Entries held by a cache.")
+for _key in ("hits", "misses", "evictions", "stale"):
+    metrics.describe(f"expenses_api_cache_{_key}_total", "counter", f"Cache {_key}.")
+metrics.describe(
+    "expenses_api_db_query_duration_seconds", "histogram", "SQL statement latency."
+)
+metrics.describe(
+    "expenses_api_db_slow_queries_total",
+    "counter",
+    "SQL statements slower than SLOW_QUERY_MS.",
+)
+
+
+def register_cache(name: str, cache) -> None:
+    """Report ``cache.stats()`` (size/hits/misses/evictions/stale) on /metrics."""
+
+    def collect():
+        stats = cache.stats()
+        labels = (("cache", name),)
+        samples = [("expenses_api_cache_size", labels, stats.get("size", 0))]
+        for key in ("hits", "misses", "evictions", "stale"):
+            samples.append(
+                (f"expenses_api_cache_{key}_total", labels, stats.get(key, 0))
+            )
+        return samples
+
+    metrics.collectors.append(collect)
+
+
+# --- SQL events ---
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if settings.INSTRUMENTATION_ENABLED:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+    metrics.observe("expenses_api_db_query_duration_seconds", elapsed, LATENCY_BUCKETS)
+    if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        metrics.inc("expenses_api_db_slow_queries_total")
+        logger.warning(
+            "slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())
+        )
+
+
+# --- routes and middleware ---
+
+
+def _endpoint_started() -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.dependency_auth_seconds = stats.auth_seconds
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            _endpoint_started()
+            with phase("endpoint"):
+                return await endpoint(*args, **kwargs)
+
+    else:
+
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            _endpoint_started()
+            with phase("endpoint"):
+                return endpoint(*args, **kwargs)
+
+    return timed
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that times the endpoint call and the whole route handler."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            with phase("handler"):
+                return await handler(request)
+
+        return timed_handler
+
+
+def _server_timing(stats: RequestStats, total: float) -> bytes:
+    return (
+        f"auth;dur={stats.auth_seconds * 1000:.2f}, "
+        f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.queries} queries", '
+        f"endpoint;dur={stats.endpoint_seconds * 1000:.2f}, "
+        f"ser;dur={stats.serialization_seconds * 1000:.2f}, "
+        f"total;dur={total * 1000:.2f}"
+    ).encode()
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.INSTRUMENTATION_ENABLED:
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        response = {"status": 500, "duration": None}
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["duration"] = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (b"server-timing", _server_timing(stats, response["duration"]))
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            duration = response["duration"] or time.perf_counter() - started
+            _record(scope["method"], route, response["status"], duration, stats)
+
+
+def _record(method: str, route: str, status: int, duration: float, stats) -> None:
+    metrics.inc(
+        "expenses_api_http_requests_total",
+        (("method", method), ("route", route), ("status", status)),
+    )
+    metrics.observe(
+        "expenses_api_http_request_duration_seconds",
+        duration,
+        LATENCY_BUCKETS,
+        (("method", method), ("route", route)),
+    )
+    for name, seconds in (
+        ("auth", stats.auth_seconds),
+        ("db", stats.sql_seconds),
+        ("endpoint", stats.endpoint_seconds),
+        ("serialization", stats.serialization_seconds),
+    ):
+        metrics.inc(
+            "expenses_api_http_phase_seconds_total",
+            (("route", route), ("phase", name)),
+            seconds,
+        )
+    metrics.observe(
+        "expenses_api_db_queries_per_request",
+        stats.queries,
+        QUERY_COUNT_BUCKETS,
+        (("route", route),),
+    )
+
+
+def _metrics_authorized(authorization: Optional[str]) -> bool:
+    expected = f"Bearer {settings.METRICS_TOKEN.get_secret_value()}"
+    return hmac.compare_digest((authorization or "").encode(), expected.encode())
+
+
+def install(app: FastAPI) -> None:
+    """Add the middleware and the /metrics route; both idle unless enabled.
+
+    /metrics also needs METRICS_TOKEN, sent as a bearer token: it shows
+    per-route timings and cache sizes.
+    """
+    app.add_middleware(InstrumentationMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics(authorization: Optional[str] = Header(None)):
+        if not settings.INSTRUMENTATION_ENABLED or settings.METRICS_TOKEN is None:
+            return Response(status_code=404)
+        if not _metrics_authorized(authorization):
+            return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+        return Response(
+            metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
@@ -1,22 +1,32 @@
+import logging
+
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from expenses_api.database import engine, Base
-from .routers import categories, expenses, auth
+from expenses_api.database import async_engine, engine
+from . import instrumentation, migrations, security
+from .routers import categories, expenses, auth, reports
+
+logger = logging.getLogger("expenses_api")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created.")
+    # only checks the version; pending migrations are a deploy step
+    if migrations.check(engine):
+        logger.info("new database migrated to version %s", migrations.HEAD)
+    security.preload()
     yield
-    print("Application shutting down.")
+    await async_engine.dispose()
+    logger.info("application shutting down")
 
 
 app = FastAPI(title="Expenses API", lifespan=lifespan)
+instrumentation.install(app)
 
 app.include_router(auth.router)
 app.include_router(categories.router)
 app.include_router(expenses.router)
+app.include_router(reports.router)
 
 
 @app.get("/health")
@@ -0,0 +1,390 @@
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import (
+    MetaData,
+    String,
+    cast,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import Column, CreateColumn, CreateTable, Index
+
+from . import changes, rollups, search, versions
+from .database import Base
+from .models import (
+    Category,
+    Expense,
+    ExpenseChange,
+    ExpenseRollup,
+    SchemaMigration,
+    normalize_category_name,
+)
+
+# Versioned schema migrations, recorded in schema_migrations.
+#
+# A new database is built by create_all, which already matches the latest
+# models, and every migration is recorded as applied. An existing database
+# runs the pending steps in order. Steps inspect the schema before acting,
+# so they also bring databases made by create_all at any earlier version up
+# to date, and a step interrupted halfway can simply be rerun.
+#
+# The steps target SQLite. Wide tables are never rewritten: columns are
+# added with ADD COLUMN, which only changes the schema. Each index is built
+# in its own transaction, so writers get the database back between indexes
+# and readers keep going throughout (WAL).
+
+logger = logging.getLogger("expenses_api.migrations")
+
+# rows copied per statement when a (small) table has to be rebuilt
+BATCH_SIZE = 5000
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Engine], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    def register(apply):
+        MIGRATIONS.append(Migration(version, name, apply))
+        return apply
+
+    return register
+
+
+# --- building blocks ---
+
+
+def _columns(engine: Engine, table: str) -> set:
+    return {column["name"] for column in inspect(engine).get_columns(table)}
+
+
+def _indexes(engine: Engine, table: str) -> set:
+    # the inspector skips expression indexes, so ask SQLite directly
+    with engine.connect() as connection:
+        return set(
+            connection.scalars(
+                text(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' "
+                    "AND tbl_name = :table AND sql IS NOT NULL"
+                ),
+                {"table": table},
+            )
+        )
+
+
+def add_column(engine: Engine, column: Column) -> None:
+    """ADD COLUMN as declared on the model, unless it already exists."""
+    if column.name in _columns(engine, column.table.name):
+        return
+    ddl = str(CreateColumn(column).compile(dialect=engine.dialect))
+    for fk in column.foreign_keys:
+        ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+        if fk.ondelete:
+            ddl += f" ON DELETE {fk.ondelete}"
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {column.table.name} ADD COLUMN {ddl}"))
+
+
+def create_index(engine: Engine, index: Index) -> None:
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        index.create(connection)
+    logger.info("built index %s in %.1fs", index.name, time.perf_counter() - started)
+
+
+def sync_indexes(engine: Engine) -> None:
+    """Drop indexes the models no longer declare and build the missing ones."""
+    for table in Base.metadata.sorted_tables:
+        existing = _indexes(engine, table.name)
+        declared = {index.name: index for index in table.indexes}
+        for name in sorted(existing - declared.keys()):
+            with engine.begin() as connection:
+                connection.execute(text(f'DROP INDEX "{name}"'))
+            logger.info("dropped index %s", name)
+        for name in sorted(declared.keys() - existing):
+            create_index(engine, declared[name])
+
+
+# --- steps ---
+
+
+@migration(1, "create missing tables")
+def _create_missing_tables(engine: Engine) -> None:
+    # create_all skips tables that exist, whatever their definition
+    Base.metadata.create_all(bind=engine)
+
+
+@migration(2, "categories: owner, normalized name, unique per owner")
+def _rebuild_categories(engine: Engine) -> None:
+    # SQLite cannot drop the old UNIQUE(name) constraint in place; the table
+    # is small, so it is copied into the current definition and swapped.
+    inspector = inspect(engine)
+    columns = _columns(engine, "categories")
+    if {"user_id", "normalized_name"} <= columns and not (
+        inspector.get_unique_constraints("categories")
+    ):
+        return
+
+    metadata = MetaData()
+    Base.metadata.tables["users"].to_metadata(metadata)
+    staging = Category.__table__.to_metadata(metadata, name="categories_rebuild")
+    copied = ["id", "name", "created_at"] + (
+        ["user_id"] if "user_id" in columns else []
+    )
+    copy = text(
+        f"INSERT INTO categories_rebuild ({', '.join(copied)}, normalized_name) "
+        f"VALUES ({', '.join(':' + name for name in copied)}, :normalized_name)"
+    )
+    seen: set = set()
+    with engine.begin() as connection:
+        connection.execute(CreateTable(staging))
+        last_id = 0
+        while True:
+            rows = (
+                connection.execute(
+                    text(
+                        f"SELECT {', '.join(copied)} FROM categories "
+                        "WHERE id > :last_id ORDER BY id LIMIT :limit"
+                    ),
+                    {"last_id": last_id, "limit": BATCH_SIZE},
+                )
+                .mappings()
+                .all()
+            )
+            if not rows:
+                break
+            batch = []
+            for row in rows:
+                row = dict(row)
+                normalized = normalize_category_name(row["name"])
+                # names that only differed by case used to be allowed; keep
+                # them, with a normalized name the unique index accepts
+                if (row.get("user_id") or 0, normalized) in seen:
+                    normalized = f"{normalized} #{row['id']}"
+                seen.add((row.get("user_id") or 0, normalized))
+                batch.append({**row, "normalized_name": normalized})
+            # plain SQL, so stored values are copied without type conversion
+            connection.execute(copy, batch)
+            last_id = rows[-1]["id"]
+        connection.execute(text("DROP TABLE categories"))
+        connection.execute(text("ALTER TABLE categories_rebuild RENAME TO categories"))
+        versions.bump(connection, versions.CATEGORIES)
+    for index in Category.__table__.indexes:
+        create_index(engine, index)
+
+
+@migration(3, "expenses: owner column")
+def _add_expense_owner(engine: Engine) -> None:
+    # existing expenses keep a NULL owner, like the categories they belong to
+    add_column(engine, Expense.__table__.c.user_id)
+
+
+@migration(4, "expense_rollups keyed by owner")
+def _rekey_rollups(engine: Engine) -> None:
+    # rollups are derived data: recreate and rebuild rather than convert
+    if "user_id" not in _columns(engine, "expense_rollups"):
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE expense_rollups"))
+        ExpenseRollup.__table__.create(engine)
+    with Session(engine) as db:
+        has_buckets = db.scalar(select(func.count()).select_from(ExpenseRollup))
+        has_expenses = db.scalar(select(Expense.id).limit(1))
+        if has_expenses and not has_buckets:
+            rollups.rebuild(db)
+
+
+@migration(5, "user-scoped indexes")
+def _sync_indexes(engine: Engine) -> None:
+    sync_indexes(engine)
+
+
+@migration(6, "expense change log")
+def _create_change_log(engine: Engine) -> None:
+    # existing expenses are logged as upserts, so since=0 is a full sync
+    ExpenseChange.__table__.create(engine, checkfirst=True)
+    with Session(engine) as db:
+        changes.backfill(db, BATCH_SIZE)
+
+
+@migration(7, "full-text index on expense names")
+def _create_search_index(engine: Engine) -> None:
+    with engine.begin() as connection:
+        search.create(connection)
+    # one pass over expenses, outside the DDL transaction
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        search.rebuild(connection)
+    logger.info("indexed expense names in %.1fs", time.perf_counter() - started)
+
+
+HEAD = MIGRATIONS[-1].version
+
+
+# --- upgrade helpers ---
+
+
+def assign_owner(engine: Engine, user_id: int) -> Tuple[int, int]:
+    """Give every ownerless category and expense to ``user_id``.
+
+    Data from before owners existed keeps a NULL owner through migrations 2
+    and 3, and no API user sees it. Categories move in one transaction; a
+    name the user already has gets the same " #id" suffix on its normalized
+    name as in migration 2. Expenses follow by id range, one transaction per
+    batch, each logged in the change feed; rollups are rebuilt at the end.
+    Returns (categories, expenses) moved; rerunning moves nothing.
+    """
+    categories = Category.__table__
+    expenses = Expense.__table__
+    owned = categories.alias("owned")
+    with Session(engine) as db:
+        db.execute(
+            update(categories)
+            .where(
+                categories.c.user_id.is_(None),
+                categories.c.normalized_name.in_(
+                    select(owned.c.normalized_name).where(owned.c.user_id == user_id)
+                ),
+            )
+            .values(
+                normalized_name=categories.c.normalized_name
+                + " #"
+                + cast(categories.c.id, String)
+            )
+        )
+        moved_categories = db.execute(
+            update(categories)
+            .where(categories.c.user_id.is_(None))
+            .values(user_id=user_id)
+        ).rowcount
+        versions.bump(db, versions.CATEGORIES)
+        db.commit()
+
+        moved_expenses = 0
+        last_id = 0
+        max_id = db.scalar(select(func.max(expenses.c.id))) or 0
+        while last_id < max_id:
+            ids = db.scalars(
+                update(expenses)
+                .where(
+                    expenses.c.user_id.is_(None),
+                    expenses.c.id > last_id,
+                    expenses.c.id <= last_id + BATCH_SIZE,
+                )
+                # the owner is not part of the representation: keep the ETag
+                .values(user_id=user_id, updated_at=expenses.c.updated_at)
+                .returning(expenses.c.id)
+            ).all()
+            if ids:
+                changes.record_upserts(db, ids)
+                moved_expenses += len(ids)
+            db.commit()
+            last_id += BATCH_SIZE
+        if moved_expenses:
+            rollups.rebuild(db)
+    logger.info(
+        "gave %s categories and %s expenses to user %s",
+        moved_categories,
+        moved_expenses,
+        user_id,
+    )
+    return moved_categories, moved_expenses
+
+
+# --- runner ---
+
+
+def current_version(engine: Engine) -> Optional[int]:
+    """Latest applied version; None when schema_migrations does not exist."""
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(select(func.max(SchemaMigration.version))) or 0
+    except DBAPIError:
+        return None
+
+
+def _record(connection: Connection, applied: List[Migration]) -> None:
+    now = datetime.now(timezone.utc)
+    connection.execute(
+        insert(SchemaMigration),
+        [{"version": m.version, "name": m.name, "applied_at": now} for m in applied],
+    )
+
+
+def _create(engine: Engine) -> bool:
+    """Build an empty database at HEAD; False if another process already did.
+
+    Workers booting together on a new SQLite file queue on the write lock
+    taken before looking at the tables, so only the first one creates them
+    and the tables and their schema_migrations rows commit together.
+    """
+    with engine.begin() as connection:
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        if inspect(connection).get_table_names():
+            return False
+        Base.metadata.create_all(bind=connection)
+        _record(connection, MIGRATIONS)
+    return True
+
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[Migration]:
+    """Apply the pending migrations up to ``target`` (default: all)."""
+    if not inspect(engine).get_table_names():
+        if not _create(engine):
+            return []  # created at HEAD by the process that won the lock
+        logger.info("created a new database at version %s", HEAD)
+        return list(MIGRATIONS)
+
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        applied = set(connection.scalars(select(SchemaMigration.version)))
+    done = []
+    for step in MIGRATIONS:
+        if step.version in applied or (target is not None and step.version > target):
+            continue
+        started = time.perf_counter()
+        step.apply(engine)
+        with engine.begin() as connection:
+            _record(connection, [step])
+        logger.info(
+            "applied %s %s in %.1fs",
+            step.version,
+            step.name,
+            time.perf_counter() - started,
+        )
+        done.append(step)
+    return done
+
+
+def check(engine: Engine) -> bool:
+    """Startup check: one query when the database is up to date.
+
+    A new, empty database is created (returns True). One with pending
+    migrations raises, since applying them can take long and belongs in a
+    deploy step (``expenses-api migrate``), not in every worker's boot.
+    """
+    version = current_version(engine)
+    if version is not None and version >= HEAD:
+        return False
+    if version is None and not inspect(engine).get_table_names():
+        # False when another worker created it first
+        return bool(migrate(engine))
+    raise RuntimeError(
+        f"database schema is at version {version or 0}, this code needs {HEAD}; "
+        "run `expenses-api migrate`"
+    )
@@ -1,12 +1,15 @@
 from sqlalchemy import (
     Column,
+    Date,
     Integer,
     String,
     DateTime,
     ForeignKey,
+    Index,
     Numeric,
     func,
     Boolean,
+    event,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import expression
@@ -21,14 +24,41 @@ class User(Base):
     is_active = Column(Boolean, server_default=expression.true(), nullable=False)
 
 
+def normalize_category_name(name: str) -> str:
+    return name.strip().casefold()
+
+
+def _normalized_name_default(context) -> str:
+    return normalize_category_name(context.get_current_parameters()["name"])
+
+
 class Category(Base):
     __tablename__ = "categories"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), nullable=False, unique=True)
+    # owner; NULL for categories created outside the API (scripts, seeds)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    name = Column(String(100), nullable=False)
+    # casefolded name, unique per owner; it serves the case-insensitive
+    # lookup and turns duplicates into a constraint error. casefold() rather
+    # than SQL lower(), which only folds ASCII on SQLite.
+    normalized_name = Column(
+        String(100), nullable=False, default=_normalized_name_default
+    )
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     expenses = relationship("Expense", back_populates="category")
 
+    __table_args__ = (
+        # coalesce() so ownerless categories are unique among themselves too
+        Index(
+            "uq_categories_owner_normalized_name",
+            func.coalesce(user_id, 0),
+            normalized_name,
+            unique=True,
+        ),
+        Index("ix_categories_user_id_name", "user_id", "name"),
+    )
+
 
 class Expense(Base):
     __tablename__ = "expenses"
@@ -36,6 +66,8 @@ class Expense(Base):
     category_id = Column(
         Integer, ForeignKey("categories.id", ondelete="RESTRICT"), nullable=False
     )
+    # owner, same as the category's
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     amount = Column(Numeric(12, 2), nullable=False)
     currency = Column(String(3), nullable=False)
     name = Column(String(500), nullable=True)
@@ -45,3 +77,114 @@ class Expense(Base):
     )
 
     category = relationship("Category", back_populates="expenses")
+
+    # Every API query filters on the owner, so each index leads with user_id
+    # and a request only walks that user's slice.
+    __table_args__ = (
+        # keyset pagination walks (created_at, id) newest first; it also
+        # serves plain created_at range scans
+        Index("ix_expenses_user_id_created_at_id", "user_id", "created_at", "id"),
+        # trailing columns let the summaries aggregate from the index alone;
+        # id keeps the keyset order intact within a category
+        Index(
+            "ix_expenses_user_id_category_id_created_at",
+            "user_id",
+            "category_id",
+            "created_at",
+            "id",
+            "currency",
+            "amount",
+        ),
+        Index(
+            "ix_expenses_user_id_currency_created_at",
+            "user_id",
+            "currency",
+            "created_at",
+            "amount",
+        ),
+        Index("ix_expenses_user_id_amount", "user_id", "amount"),
+    )
+
+
+@event.listens_for(Expense.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    # the full-text index of names (search.py) comes with the table, whoever
+    # runs create_all and whatever they imported
+    if connection.dialect.name == "sqlite":
+        from . import search
+
+        search.create(connection)
+
+
+class ExpenseRollup(Base):
+    """Per (owner, month, category, currency) aggregates of ``expenses``.
+
+    Maintained by crud in the same transaction as each expense write;
+    ``rollups.rebuild`` recomputes it from scratch. ``user_id`` is 0 for
+    ownerless expenses, since primary key columns cannot be NULL.
+    """
+
+    __tablename__ = "expense_rollups"
+    user_id = Column(Integer, primary_key=True)
+    month = Column(String(7), primary_key=True)
+    category_id = Column(Integer, primary_key=True)
+    currency = Column(String(3), primary_key=True)
+    total_amount = Column(Numeric(18, 2), nullable=False)
+    expense_count = Column(Integer, nullable=False)
+    min_amount = Column(Numeric(12, 2), nullable=False)
+    max_amount = Column(Numeric(12, 2), nullable=False)
+
+
+class ExpenseChange(Base):
+    """Latest change of each expense, for the sync feed; see ``changes``."""
+
+    __tablename__ = "expense_changes"
+    # AUTOINCREMENT: a seq is never handed out twice, even after the row
+    # holding the highest one is replaced or compacted
+    seq = Column(Integer, primary_key=True)
+    # no foreign key: a tombstone outlives its expense
+    expense_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    op = Column(String(6), nullable=False)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # the feed walks one owner's changes in seq order
+        Index("ix_expense_changes_user_id_seq", "user_id", "seq"),
+        # one row per expense; writes replace it
+        Index("uq_expense_changes_expense_id", "expense_id", unique=True),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class FxRate(Base):
+    """Units of ``currency`` per one FX_BASE_CURRENCY, effective from ``rate_date``.
+
+    A rate applies until the currency's next ``rate_date``; see ``fx``.
+    """
+
+    __tablename__ = "fx_rates"
+    currency = Column(String(3), primary_key=True)
+    rate_date = Column(Date, primary_key=True)
+    rate = Column(Numeric(18, 8), nullable=False)
+
+
+class DataVersion(Base):
+    """Write counter per dataset, bumped in the same transaction as the write.
+
+    Lets readers validate caches with one primary-key lookup.
+    """
+
+    __tablename__ = "data_versions"
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class SchemaMigration(Base):
+    """One row per applied ``migrations`` step; see ``migrations.check``."""
+
+    __tablename__ = "schema_migrations"
+    version = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,72 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional, Tuple
+
+from .caching import TTLCache
+from .instrumentation import register_cache
+from .settings import settings
+
+# Keyset pagination helpers. A cursor is an opaque, url-safe token holding the
+# (created_at, id) key of the row it was cut at and the direction to walk.
+
+NEXT = "next"
+PREV = "prev"
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+def encode_cursor(created_at: str, expense_id: int, direction: str = NEXT) -> str:
+    raw = json.dumps([str(created_at), expense_id, direction], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[str, int, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, expense_id, direction = json.loads(
+            base64.urlsafe_b64decode(padded.encode())
+        )
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+    if (
+        not isinstance(created_at, str)
+        or not isinstance(expense_id, int)
+        or direction not in (NEXT, PREV)
+    ):
+        raise ValueError("invalid cursor")
+    return created_at, expense_id, direction
+
+
+class CountCache(TTLCache):
+    """Short-lived cache of COUNT(*) results keyed by filter set.
+
+    Keys are whatever filters clients send, so it is bounded like any
+    TTLCache. Writes going through crud call ``invalidate``; writes from
+    other processes are only picked up once the TTL expires.
+    """
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop ``key``, or every entry when no key is given."""
+        if key is not None:
+            super().invalidate(key)
+            return
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache(
+    settings.COUNT_CACHE_MAX_SIZE, settings.COUNT_CACHE_TTL_SECONDS
+)
+register_cache("count_cache", count_cache)
+
+
+def cache_key(**filters: Any) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in filters.items() if v is not None))
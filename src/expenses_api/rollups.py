@@ -0,0 +1,154 @@
+from typing import Iterable, NamedTuple, Optional
+from decimal import Decimal
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import versions
+from .models import Expense, ExpenseRollup
+
+# Incremental maintenance of the expense_rollups table. Callers flush their
+# expense changes first, then fold them in before committing, so buckets and
+# expenses always move together.
+
+_month = func.strftime("%Y-%m", Expense.created_at)
+_owner = func.coalesce(Expense.user_id, 0)
+_bucket_columns = [
+    ExpenseRollup.user_id,
+    ExpenseRollup.month,
+    ExpenseRollup.category_id,
+    ExpenseRollup.currency,
+    ExpenseRollup.total_amount,
+    ExpenseRollup.expense_count,
+    ExpenseRollup.min_amount,
+    ExpenseRollup.max_amount,
+]
+
+
+class Contribution(NamedTuple):
+    user_id: int
+    month: str
+    category_id: int
+    currency: str
+    amount: Decimal
+
+
+def _aggregate(*criteria):
+    return (
+        select(
+            _owner.label("user_id"),
+            _month.label("month"),
+            Expense.category_id,
+            Expense.currency,
+            func.sum(Expense.amount).label("total_amount"),
+            func.count().label("expense_count"),
+            func.min(Expense.amount).label("min_amount"),
+            func.max(Expense.amount).label("max_amount"),
+        )
+        .where(*criteria)
+        .group_by(_owner, _month, Expense.category_id, Expense.currency)
+    )
+
+
+def snapshot(db: Session, expense_id: int) -> Optional[Contribution]:
+    """What an expense currently contributes, read before changing it.
+
+    Read through a no-op UPDATE ... RETURNING rather than a SELECT: the
+    statement takes the write lock, so no other writer can change the
+    expense until this transaction commits and the snapshot stays exact
+    when it is retracted.
+    """
+    expenses = Expense.__table__
+    row = db.execute(
+        update(expenses)
+        .where(expenses.c.id == expense_id)
+        # assigned explicitly, so the onupdate timestamp does not fire
+        .values(updated_at=expenses.c.updated_at)
+        .returning(
+            _owner, _month, Expense.category_id, Expense.currency, Expense.amount
+        )
+    ).first()
+    return Contribution(*row) if row else None
+
+
+def apply(db: Session, expense_ids: Iterable[int]) -> None:
+    """Add the given (flushed) expenses to their buckets."""
+    stmt = sqlite_insert(ExpenseRollup).from_select(
+        _bucket_columns, _aggregate(Expense.id.in_(list(expense_ids)))
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "month", "category_id", "currency"],
+        set_={
+            "total_amount": ExpenseRollup.total_amount + stmt.excluded.total_amount,
+            "expense_count": ExpenseRollup.expense_count + stmt.excluded.expense_count,
+            "min_amount": func.min(ExpenseRollup.min_amount, stmt.excluded.min_amount),
+            "max_amount": func.max(ExpenseRollup.max_amount, stmt.excluded.max_amount),
+        },
+    )
+    db.execute(stmt)
+
+
+def retract(db: Session, old: Contribution) -> None:
+    """Remove a snapshot taken before the expense was changed or deleted."""
+    bucket = and_(
+        ExpenseRollup.user_id == old.user_id,
+        ExpenseRollup.month == old.month,
+        ExpenseRollup.category_id == old.category_id,
+        ExpenseRollup.currency == old.currency,
+    )
+    db.execute(
+        update(ExpenseRollup)
+        .where(bucket)
+        .values(
+            total_amount=ExpenseRollup.total_amount - old.amount,
+            expense_count=ExpenseRollup.expense_count - 1,
+        )
+    )
+    db.execute(delete(ExpenseRollup).where(bucket, ExpenseRollup.expense_count <= 0))
+
+    # min/max cannot be decremented; rescan the bucket only when the removed
+    # amount was one of its bounds
+    owner = (
+        Expense.user_id.is_(None)
+        if old.user_id == 0
+        else Expense.user_id == old.user_id
+    )
+    remaining = _aggregate(
+        owner,
+        Expense.category_id == old.category_id,
+        Expense.currency == old.currency,
+        _month == old.month,
+    ).subquery()
+    db.execute(
+        update(ExpenseRollup)
+        .where(
+            bucket,
+            (ExpenseRollup.min_amount == old.amount)
+            | (ExpenseRollup.max_amount == old.amount),
+        )
+        .values(
+            min_amount=select(remaining.c.min_amount).scalar_subquery(),
+            max_amount=select(remaining.c.max_amount).scalar_subquery(),
+        )
+    )
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every bucket from the expenses table.
+
+    Bumps the expenses stamp, since report ETags stand for the buckets and
+    a rebuild may change them.
+    """
+    db.execute(delete(ExpenseRollup))
+    db.execute(insert(ExpenseRollup).from_select(_bucket_columns, _aggregate()))
+    versions.bump(db, versions.EXPENSES)
+    db.commit()
+    return db.execute(select(func.count()).select_from(ExpenseRollup)).scalar_one()
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    with SessionLocal() as session:
+        print(f"Rebuilt {rebuild(session)} rollup buckets.")
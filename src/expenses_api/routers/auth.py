@@ -1,38 +1,44 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..deps import get_session
+from ..crud import acreate_user, aget_user_by_username, aset_password_hash
+from ..deps import get_async_session
+from ..instrumentation import InstrumentedRoute
 from ..schemas import Token, UserCreate, UserOut
-from ..models import User
-from ..security import get_password_hash, verify_password, create_access_token
+from ..security import (
+    aget_password_hash,
+    averify_and_update_password,
+    create_access_token,
+)
 from ..settings import settings
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(
+    prefix="/auth", tags=["Authentication"], route_class=InstrumentedRoute
+)
 
 
 @router.post("/register", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def register_user(payload: UserCreate, db: Session = Depends(get_session)):
+async def register_user(
+    payload: UserCreate, db: AsyncSession = Depends(get_async_session)
+):
     # 1. Check if user already exists
-    if db.query(User).filter(User.username == payload.username).first():
+    if await aget_user_by_username(db, payload.username):
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    # 2. Hash password and create user
-    hashed_password = get_password_hash(payload.password)
-    user = User(username=payload.username, hashed_password=hashed_password)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+    # 2. Hash password (on the hashing pool) and create user
+    hashed_password = await aget_password_hash(payload.password)
+    return await acreate_user(db, payload.username, hashed_password)
 
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_session)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_session),
 ):
     # 1. Fetch user
-    user = db.query(User).filter(User.username == form_data.username).first()
+    user = await aget_user_by_username(db, form_data.username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,13 +46,18 @@ def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # 2. Verify password
-    if not verify_password(form_data.password, user.hashed_password):
+    # 2. Verify password, upgrading the hash if the argon2 settings changed
+    valid, new_hash = await averify_and_update_password(
+        form_data.password, user.hashed_password
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        await aset_password_hash(db, user.id, new_hash)
 
     # 3. Create token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
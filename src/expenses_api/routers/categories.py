@@ -1,46 +1,47 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 from ..schemas import CategoryCreate, CategoryOut
-from ..deps import get_session
-from ..crud import create_category, list_categories, delete_category
-from expenses_api import models
+from ..deps import get_async_session
+from ..instrumentation import InstrumentedRoute
+from ..crud import acreate_category, alist_categories, adelete_category, aget_category
 from ..security import get_current_user
 from ..models import User
 
-router = APIRouter(prefix="/categories", tags=["Categories"])
+router = APIRouter(
+    prefix="/categories", tags=["Categories"], route_class=InstrumentedRoute
+)
 
 
 @router.get("", response_model=list[CategoryOut])
-def get_categories(
-    db: Session = Depends(get_session), current_user: User = Depends(get_current_user)
+async def get_categories(
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
 ):
-    return list_categories(db)
+    return await alist_categories(db, current_user.id)
 
 
 @router.post("", response_model=CategoryOut, status_code=status.HTTP_201_CREATED)
-def post_category(
+async def post_category(
     payload: CategoryCreate,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
 ):
-    existing = [
-        c for c in list_categories(db) if c.name.lower() == payload.name.lower()
-    ]
-    if existing:
+    try:
+        return await acreate_category(db, payload.name, current_user.id)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Category already exists")
-    return create_category(db, payload.name)
 
 
 @router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete(
+async def delete(
     category_id: int,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
 ):
-    obj = db.get(models.Category, category_id)
+    obj = await aget_category(db, category_id, current_user.id)
 
     if obj is None:
         raise HTTPException(status_code=404, detail="Category not found")
-    return delete_category(db, category_id)
+    return await adelete_category(db, category_id, current_user.id)
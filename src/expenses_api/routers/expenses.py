@@ -1,83 +1,454 @@
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+import csv
+import io
+import json
+from operator import itemgetter
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional, Union
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from decimal import Decimal
 
 from expenses_api.security import get_current_user
-from ..deps import get_session
-from ..schemas import ExpenseCreate, ExpenseOut, PaginatedExpenses
-from ..crud import create_expense, get_expense, list_expenses, delete_expense
-from ..models import Expense
+from ..deps import get_async_session
+from ..instrumentation import InstrumentedRoute
+from ..schemas import (
+    BulkExpenseResult,
+    BulkRowError,
+    ExpenseBatch,
+    ExpenseChangeFeed,
+    ExpenseChangeOut,
+    ExpenseCreate,
+    ExpenseOut,
+    ExpensePage,
+    ExpenseUpdate,
+    PaginatedExpenses,
+)
+from ..crud import (
+    EXPENSE_COLUMNS,
+    abulk_create_expenses,
+    acreate_expense,
+    aexisting_category_ids,
+    aget_expense,
+    aget_expenses,
+    apaginate_expenses,
+    adelete_expense,
+    aexpense_changes,
+    astream_expenses,
+    asupported_currencies,
+    aupdate_expense,
+)
 from ..models import User
+from ..settings import settings
 
 
-router = APIRouter(prefix="/expenses", tags=["Expenses"])
+router = APIRouter(prefix="/expenses", tags=["Expenses"], route_class=InstrumentedRoute)
+
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+# List pages are plain rows dumped by pydantic-core through TypedDicts
+# mirroring the response models: no per-row model is built or validated,
+# and returning a Response skips FastAPI's response_model pass.
+_page_adapter = TypeAdapter(ExpensePage)
+_ITEM_FIELDS = tuple(ExpenseOut.model_fields)
+_item_values = itemgetter(*(EXPENSE_COLUMNS.index(name) for name in _ITEM_FIELDS))
 
 
 @router.post("", response_model=ExpenseOut, status_code=status.HTTP_201_CREATED)
-def post_expense(
+async def post_expense(
     payload: ExpenseCreate,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
 ):
-    if payload.currency.upper() not in {"EUR", "USD"}:
-        raise HTTPException(status_code=400, detail="Unsupported currency for now")
-    return create_expense(
+    if payload.currency.upper() not in await asupported_currencies(db):
+        raise HTTPException(status_code=400, detail="Unsupported currency")
+    if not await aexisting_category_ids(db, {payload.category_id}, current_user.id):
+        raise HTTPException(status_code=400, detail="Category not found")
+    return await acreate_expense(
         db,
         payload.category_id,
         Decimal(payload.amount),
         payload.currency.upper(),
         payload.name,
+        current_user.id,
+    )
+
+
+async def _bulk_records(request: Request):
+    """Yield (index, record) from a JSON array or an NDJSON stream.
+
+    NDJSON lines are yielded as raw bytes as they arrive, so a large import
+    is never held in memory as a whole.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        index, buffer = 0, b""
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buffer.strip():
+            yield index, buffer
+        return
+
+    try:
+        records = json.loads(await request.body())
+    except ValueError:
+        records = None
+    if not isinstance(records, list):
+        raise HTTPException(
+            status_code=400, detail="Body must be a JSON array or NDJSON"
+        )
+    for index, record in enumerate(records):
+        yield index, record
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in exc.errors()
+    )
+
+
+async def _insert_batch(
+    db: AsyncSession,
+    user_id: int,
+    batch: list,
+    known_categories: set,
+    result: BulkExpenseResult,
+):
+    unknown = {payload.category_id for _, payload in batch} - known_categories
+    if unknown:
+        known_categories |= await aexisting_category_ids(db, unknown, user_id)
+
+    rows = []
+    for index, payload in batch:
+        if payload.category_id in known_categories:
+            rows.append(payload.model_dump())
+        else:
+            result.errors.append(BulkRowError(index=index, detail="Category not found"))
+
+    ids = await abulk_create_expenses(db, rows, user_id)
+    result.ids += ids
+    result.inserted += len(ids)
+
+
+@router.post("/bulk", response_model=BulkExpenseResult)
+async def post_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    result = BulkExpenseResult(inserted=0, ids=[], errors=[])
+    currencies = await asupported_currencies(db)
+    known_categories: set = set()
+    batch = []
+
+    async for index, record in _bulk_records(request):
+        if index >= settings.BULK_MAX_ROWS:
+            result.errors.append(
+                BulkRowError(index=index, detail="Row limit exceeded, rest ignored")
+            )
+            break
+        try:
+            if isinstance(record, bytes):
+                payload = ExpenseCreate.model_validate_json(record)
+            else:
+                payload = ExpenseCreate.model_validate(record)
+        except ValidationError as exc:
+            result.errors.append(BulkRowError(index=index, detail=_describe(exc)))
+            continue
+        if payload.currency.upper() not in currencies:
+            result.errors.append(
+                BulkRowError(index=index, detail="Unsupported currency")
+            )
+            continue
+
+        batch.append((index, payload))
+        if len(batch) >= settings.BULK_CHUNK_SIZE:
+            await _insert_batch(db, current_user.id, batch, known_categories, result)
+            batch = []
+
+    if batch:
+        await _insert_batch(db, current_user.id, batch, known_categories, result)
+    result.errors.sort(key=lambda error: error.index)
+    return result
+
+
+def _export_value(value):
+    if value is None or isinstance(value, (int, str)):
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+async def _export_csv(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPENSE_COLUMNS)
+    async for rows in partitions:
+        writer.writerows([_export_value(v) for v in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def _export_ndjson(partitions):
+    async for rows in partitions:
+        yield "".join(
+            json.dumps(dict(zip(EXPENSE_COLUMNS, map(_export_value, row)))) + "\n"
+            for row in rows
+        )
+
+
+@router.get("/export")
+async def export(
+    format: Literal["csv", "ndjson"] = "csv",
+    from_dt: Optional[datetime] = None,
+    to_dt: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    min_amount: Optional[Decimal] = None,
+    max_amount: Optional[Decimal] = None,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    # Rows are read with yield_per and written out batch by batch as plain
+    # tuples, so memory stays flat whatever the size of the export.
+    partitions = astream_expenses(
+        db,
+        batch_size=settings.EXPORT_BATCH_SIZE,
+        user_id=current_user.id,
+        from_dt=from_dt,
+        to_dt=to_dt,
+        category_id=category_id,
+        min_amount=min_amount,
+        max_amount=max_amount,
     )
+    if format == "csv":
+        body, media_type = _export_csv(partitions), "text/csv"
+    else:
+        body, media_type = _export_ndjson(partitions), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="expenses.{format}"'},
+    )
+
+
+@router.get("/changes", response_model=ExpenseChangeFeed)
+async def get_changes(
+    since: int = Query(0, ge=0, description="next_since of the previous call"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    # A client keeps next_since and polls with it; one that has never synced
+    # starts from 0, which replays every current expense.
+    try:
+        feed = await aexpense_changes(
+            db, since=since, limit=limit, user_id=current_user.id
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Sync token expired, resync with since=0",
+        )
+    return ExpenseChangeFeed(
+        changes=[
+            ExpenseChangeOut(
+                seq=seq,
+                op=op,
+                id=expense_id,
+                expense=dict(zip(EXPENSE_COLUMNS, expense)) if expense[0] else None,
+            )
+            for seq, op, expense_id, *expense in feed.items
+        ],
+        next_since=feed.next_since,
+        has_more=feed.has_more,
+    )
+
+
+# An expense's ETag is its updated_at in microseconds since the epoch. It is
+# strong: If-Match on PATCH turns it back into the version the conditional
+# UPDATE expects. A PATCH is two statements in one transaction: a no-op
+# UPDATE ... RETURNING that takes the write lock and reads the old values the
+# rollups subtract, then the conditional UPDATE itself. The version check
+# stays in the second one's WHERE clause, so it is still atomic.
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _etag(expense) -> str:
+    updated_at = expense.updated_at
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return f'"{(updated_at - _EPOCH) // _MICROSECOND}"'
+
+
+def _expected_version(if_match: str) -> Optional[datetime]:
+    """Version named by an If-Match header; None for ``*`` (any version)."""
+    tag = if_match.strip()
+    if tag == "*":
+        return None
+    if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+        return _EPOCH + int(tag[1:-1]) * _MICROSECOND
+    # weak, malformed or several tags: none of them can be the current one
+    raise HTTPException(status_code=412, detail="Precondition failed")
 
 
 @router.get("/{expense_id}", response_model=ExpenseOut)
-def get_one(
+async def get_one(
     expense_id: int,
-    db: Session = Depends(get_session),
+    response: Response,
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
 ):
-    expense = get_expense(db, expense_id)
+    expense = await aget_expense(db, expense_id, current_user.id)
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
+    response.headers["ETag"] = _etag(expense)
     return expense
 
 
-@router.get("", response_model=PaginatedExpenses)
-def get_list(
+@router.patch("/{expense_id}", response_model=ExpenseOut)
+async def patch_expense(
+    expense_id: int,
+    payload: ExpenseUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    patch = payload.model_dump(exclude_unset=True)
+    expected = _expected_version(if_match) if if_match is not None else None
+    if "currency" in patch and patch["currency"].upper() not in (
+        await asupported_currencies(db)
+    ):
+        raise HTTPException(status_code=400, detail="Unsupported currency")
+    if "category_id" in patch and not await aexisting_category_ids(
+        db, {patch["category_id"]}, current_user.id
+    ):
+        raise HTTPException(status_code=400, detail="Category not found")
+    try:
+        expense = await aupdate_expense(
+            db, expense_id, patch, expected, current_user.id
+        )
+    except ValueError:
+        raise HTTPException(status_code=412, detail="Expense was modified")
+    if expense is None:
+        # RFC 9110 13.1.1: If-Match fails on a missing resource too, with
+        # the same answer as on a stale one
+        if if_match is not None:
+            raise HTTPException(status_code=412, detail="Expense was modified")
+        raise HTTPException(status_code=404, detail="Expense not found")
+    response.headers["ETag"] = _etag(expense)
+    return expense
+
+
+def _parse_ids(ids: str) -> list:
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid ids")
+    if not parsed:
+        raise HTTPException(status_code=400, detail="Invalid ids")
+    if len(parsed) > settings.MULTI_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.MULTI_GET_MAX_IDS} ids per request",
+        )
+    return parsed
+
+
+async def _get_many(db: AsyncSession, ids: str, user: User) -> Response:
+    items, missing = await aget_expenses(db, _parse_ids(ids), user.id)
+    body = ExpenseBatch(
+        items=[ExpenseOut.model_validate(item) for item in items], missing=missing
+    )
+    return Response(body.model_dump_json(), media_type="application/json")
+
+
+@router.get("", response_model=Union[PaginatedExpenses, ExpenseBatch])
+async def get_list(
+    ids: Optional[str] = Query(
+        None, description="Comma-separated ids; returns those expenses only"
+    ),
+    q: Optional[str] = Query(
+        None, max_length=200, description="Words to find in names, best matches first"
+    ),
     page: int = Query(1, ge=1),
     size: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    from_dt: Optional[datetime] = None,
+    to_dt: Optional[datetime] = None,
     category_id: Optional[int] = None,
     min_amount: Optional[Decimal] = None,
     max_amount: Optional[Decimal] = None,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
 ):
-    items, total = list_expenses(
-        db=db,
-        page=page,
-        size=size,
-        category_id=category_id,
-        min_amount=min_amount,
-        max_amount=max_amount,
-    )
+    if ids is not None:
+        return await _get_many(db, ids, current_user)
+    if q is not None and cursor is not None:
+        raise HTTPException(
+            status_code=400, detail="Search results are paged with page, not cursor"
+        )
+    # page/size clients always got a total; cursor clients opt in to it
+    if include_total is None:
+        include_total = cursor is None
+    try:
+        result = await apaginate_expenses(
+            db,
+            size=size,
+            page=page,
+            cursor=cursor,
+            include_total=include_total,
+            user_id=current_user.id,
+            from_dt=from_dt,
+            to_dt=to_dt,
+            category_id=category_id,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            search_text=q,
+        )
+    except ValueError:
+        detail = "Invalid cursor" if q is None else "Search needs at least one word"
+        raise HTTPException(status_code=400, detail=detail)
 
-    return PaginatedExpenses(
-        page=page,
-        size=size,
-        total=total,
-        items=items,
-    )
+    page_body = {
+        "items": [dict(zip(_ITEM_FIELDS, _item_values(row))) for row in result.items],
+        "total": result.total,
+        "page": page if cursor is None else None,
+        "size": size,
+        "next_cursor": result.next_cursor,
+        "prev_cursor": result.prev_cursor,
+    }
+    return Response(_page_adapter.dump_json(page_body), media_type="application/json")
 
 
 @router.delete("/{expense_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete(
+async def delete(
     expense_id: int,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
 ):
-    obj = db.get(Expense, expense_id)
+    obj = await aget_expense(db, expense_id, current_user.id)
 
     if obj is None:
         raise HTTPException(status_code=404, detail="Category not found")
-    return delete_expense(db, expense_id)
+    return await adelete_expense(db, expense_id, current_user.id)
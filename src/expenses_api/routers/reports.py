@@ -0,0 +1,181 @@
+import hashlib
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import crud
+from ..deps import get_async_session
+from ..instrumentation import InstrumentedRoute
+from ..models import User
+from ..schemas import SummaryRow
+from ..security import get_current_user
+
+router = APIRouter(prefix="/reports", tags=["Reports"], route_class=InstrumentedRoute)
+
+# Every report is validated against the expenses/categories/fx_rates write
+# stamps. Dashboards polling an unchanged dataset get a 304 after a single
+# primary key lookup instead of a re-aggregation.
+
+
+def _validators(request: Request, user: User, stamps: dict):
+    versions = ".".join(str(stamps[name].version) for name in sorted(stamps))
+    query = sorted(request.query_params.multi_items())
+    digest = hashlib.sha1(
+        f"{user.id}|{versions}|{request.url.path}|{query}".encode()
+    ).hexdigest()[:20]
+    modified = [s.updated_at for s in stamps.values() if s.updated_at is not None]
+    last_modified = max(modified).replace(microsecond=0) if modified else None
+    return f'"{digest}"', last_modified
+
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[datetime]):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def _report(
+    summarize,
+    request: Request,
+    response: Response,
+    db: AsyncSession,
+    user: User,
+    from_dt: Optional[datetime],
+    to_dt: Optional[datetime],
+    category_id: Optional[int],
+    target_currency: Optional[str],
+):
+    if target_currency is not None:
+        target_currency = target_currency.upper()
+        if target_currency not in await crud.asupported_currencies(db):
+            raise HTTPException(status_code=400, detail="Unsupported currency")
+
+    stamps = await crud.areport_versions(db)
+    etag, last_modified = _validators(request, user, stamps)
+    # per-user content: shared caches must not store it
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    try:
+        return await summarize(
+            db,
+            from_dt=from_dt,
+            to_dt=to_dt,
+            category_id=category_id,
+            user_id=user.id,
+            target_currency=target_currency,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Missing exchange rate")
+
+
+@router.get("/by-category", response_model=list[SummaryRow])
+async def by_category(
+    request: Request,
+    response: Response,
+    from_dt: Optional[datetime] = None,
+    to_dt: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    target_currency: Optional[str] = Query(None, min_length=3, max_length=3),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    return await _report(
+        crud.asummary_by_category,
+        request,
+        response,
+        db,
+        current_user,
+        from_dt,
+        to_dt,
+        category_id,
+        target_currency,
+    )
+
+
+@router.get("/by-month", response_model=list[SummaryRow])
+async def by_month(
+    request: Request,
+    response: Response,
+    from_dt: Optional[datetime] = None,
+    to_dt: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    target_currency: Optional[str] = Query(None, min_length=3, max_length=3),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    return await _report(
+        crud.asummary_by_month,
+        request,
+        response,
+        db,
+        current_user,
+        from_dt,
+        to_dt,
+        category_id,
+        target_currency,
+    )
+
+
+@router.get("/by-day", response_model=list[SummaryRow])
+async def by_day(
+    request: Request,
+    response: Response,
+    from_dt: Optional[datetime] = None,
+    to_dt: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    target_currency: Optional[str] = Query(None, min_length=3, max_length=3),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    return await _report(
+        crud.asummary_by_day,
+        request,
+        response,
+        db,
+        current_user,
+        from_dt,
+        to_dt,
+        category_id,
+        target_currency,
+    )
+
+
+@router.get("/by-currency", response_model=list[SummaryRow])
+async def by_currency(
+    request: Request,
+    response: Response,
+    from_dt: Optional[datetime] = None,
+    to_dt: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    target_currency: Optional[str] = Query(None, min_length=3, max_length=3),
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    return await _report(
+        crud.asummary_by_currency,
+        request,
+        response,
+        db,
+        current_user,
+        from_dt,
+        to_dt,
+        category_id,
+        target_currency,
+    )
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, condecimal, constr
+from pydantic import BaseModel, condecimal, constr, field_validator
 from datetime import datetime
-from typing import Optional
+from decimal import Decimal
+from typing import Literal, Optional, TypedDict
 
 
 class UserBase(BaseModel):
@@ -43,6 +44,22 @@ class ExpenseCreate(BaseModel):
     name: Optional[str] = None
 
 
+class ExpenseUpdate(BaseModel):
+    """Fields to change; omitted fields are left as they are."""
+
+    category_id: Optional[int] = None
+    amount: Optional[condecimal(max_digits=12, decimal_places=2)] = None
+    currency: Optional[constr(min_length=3, max_length=3)] = None
+    name: Optional[str] = None
+
+    @field_validator("category_id", "amount", "currency")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+
 class ExpenseOut(ExpenseCreate):
     id: int
     created_at: datetime
@@ -52,7 +69,72 @@ class ExpenseOut(ExpenseCreate):
 
 class PaginatedExpenses(BaseModel):
     items: list[ExpenseOut]
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     size: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
     model_config = {"from_attributes": True}
+
+
+class ExpenseBatch(BaseModel):
+    items: list[ExpenseOut]
+    missing: list[int]
+
+
+class ExpenseChangeOut(BaseModel):
+    seq: int
+    op: Literal["upsert", "delete"]
+    id: int
+    # current state for upserts, None for deletions
+    expense: Optional[ExpenseOut] = None
+
+
+class ExpenseChangeFeed(BaseModel):
+    changes: list[ExpenseChangeOut]
+    next_since: int
+    has_more: bool
+
+
+class ExpenseItem(TypedDict):
+    """``ExpenseOut`` as a plain dict, in the same field order.
+
+    List endpoints dump database rows through a TypeAdapter of these, which
+    skips building and validating a model per row.
+    """
+
+    category_id: int
+    amount: Decimal
+    currency: str
+    name: Optional[str]
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+
+class ExpensePage(TypedDict):
+    """``PaginatedExpenses`` as a plain dict."""
+
+    items: list[ExpenseItem]
+    total: Optional[int]
+    page: Optional[int]
+    size: int
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+class BulkRowError(BaseModel):
+    index: int
+    detail: str
+
+
+class BulkExpenseResult(BaseModel):
+    inserted: int
+    ids: list[int]
+    errors: list[BulkRowError]
+
+
+class SummaryRow(BaseModel):
+    key: str
+    currency: str
+    total_amount: Decimal
@@ -0,0 +1,84 @@
+import re
+
+from sqlalchemy import column, table, text
+from sqlalchemy.engine import Connection
+
+# Full-text search over expense names. expenses_fts is an FTS5 index with
+# expenses as its external content: it stores only the inverted index, and
+# triggers keep it in step with every INSERT, UPDATE OF name and DELETE on
+# expenses, whoever issues them. A match is a lookup of each term in the
+# index rather than a scan of the names. create_all builds it along with the
+# expenses table (see models).
+
+fts = table("expenses_fts", column("rowid"), column("name"), column("rank"))
+
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5("
+    "name, content='expenses', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+# Shorter last words only match whole words: a one- or two-letter prefix
+# expands to a large share of the vocabulary, and every match gets ranked.
+PREFIX_MIN_LENGTH = 3
+
+# external content: a removal has to repeat the indexed value
+TRIGGERS = {
+    "expenses_fts_insert": (
+        "AFTER INSERT ON expenses BEGIN "
+        "INSERT INTO expenses_fts (rowid, name) VALUES (new.id, new.name); END"
+    ),
+    "expenses_fts_delete": (
+        "AFTER DELETE ON expenses BEGIN "
+        "INSERT INTO expenses_fts (expenses_fts, rowid, name) "
+        "VALUES ('delete', old.id, old.name); END"
+    ),
+    "expenses_fts_update": (
+        "AFTER UPDATE OF name ON expenses BEGIN "
+        "INSERT INTO expenses_fts (expenses_fts, rowid, name) "
+        "VALUES ('delete', old.id, old.name); "
+        "INSERT INTO expenses_fts (rowid, name) VALUES (new.id, new.name); END"
+    ),
+}
+
+
+def create(connection: Connection) -> None:
+    """Create the index and its triggers where missing (no backfill)."""
+    connection.execute(text(CREATE_TABLE))
+    for name, body in TRIGGERS.items():
+        connection.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+
+
+def drop_triggers(connection: Connection) -> None:
+    """Stop maintaining the index, e.g. around a bulk load; ``create`` and
+    ``rebuild`` afterwards."""
+    for name in TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+
+
+def rebuild(connection: Connection) -> None:
+    """Re-index every expense name from the expenses table."""
+    connection.execute(
+        text("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+    )
+
+
+def clear(connection: Connection) -> None:
+    connection.execute(
+        text("INSERT INTO expenses_fts (expenses_fts) VALUES ('delete-all')")
+    )
+
+
+def match_expression(query: str) -> str:
+    """FTS5 query for free text: every word must match, the last one as a
+    prefix (search as you type). Raises ValueError when there is no word.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are
+    taken literally.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        raise ValueError("invalid search")
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= PREFIX_MIN_LENGTH:
+        terms[-1] += "*"
+    return " ".join(terms)
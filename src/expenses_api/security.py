@@ -1,29 +1,158 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import TYPE_CHECKING, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from .caching import TTLCache
+from .instrumentation import phase, register_cache
 from .settings import settings
-from .deps import get_session
+from .crud import aget_user_by_username
+from .deps import get_async_session
 from .models import User
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+# passlib/argon2 and jose (through cryptography) are a large share of the
+# import time, so they are imported on first use rather than at startup;
+# ``preload`` warms them in the background once the app is serving.
+
+
+def make_password_context(
+    time_cost: int, memory_cost: int, parallelism: int
+) -> "CryptContext":
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["argon2"],
+        deprecated="auto",
+        argon2__rounds=time_cost,
+        argon2__memory_cost=memory_cost,
+        argon2__parallelism=parallelism,
+    )
+
+
+_pwd_context: Optional["CryptContext"] = None
+
+
+def password_context() -> "CryptContext":
+    global _pwd_context
+    if _pwd_context is None:
+        _pwd_context = make_password_context(
+            settings.ARGON2_TIME_COST,
+            settings.ARGON2_MEMORY_COST,
+            settings.ARGON2_PARALLELISM,
+        )
+    return _pwd_context
+
+
+def __getattr__(name: str):
+    # keeps ``security.pwd_context`` importable without building it eagerly
+    if name == "pwd_context":
+        return password_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+# username -> detached User, so authenticated requests skip the user SELECT
+user_cache = TTLCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL_SECONDS)
+register_cache("user_cache", user_cache)
+
+
+def _principal(user: User) -> User:
+    return User(id=user.id, username=user.username, is_active=user.is_active)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _forget_user(mapper, connection, target: User) -> None:
+    user_cache.invalidate(target.username)
+    # a rename leaves the old name cached too
+    for username in inspect(target).attrs.username.history.deleted:
+        user_cache.invalidate(username)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_context().hash(password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verify, and return a new hash when the stored one uses old parameters."""
+    return password_context().verify_and_update(plain_password, hashed_password)
+
+
+# Hashing runs on its own small pool (argon2 releases the GIL) instead of the
+# shared threadpool, so a login burst cannot starve the other endpoints.
+# Beyond HASH_POOL_WORKERS running plus HASH_QUEUE_LIMIT waiting, callers get
+# a 503 rather than queueing without bound.
+_hash_pool = ThreadPoolExecutor(
+    max_workers=settings.HASH_POOL_WORKERS, thread_name_prefix="password-hash"
+)
+_hash_slots = threading.BoundedSemaphore(
+    settings.HASH_POOL_WORKERS + settings.HASH_QUEUE_LIMIT
+)
+
+
+_preloaded = threading.Event()
+
+
+def _load_backends() -> None:
+    import jose.jwt  # noqa: F401
+
+    password_context().handler("argon2").get_backend()
+
+
+def preload() -> None:
+    """Import the security backends on the hashing pool, off the event loop."""
+    if not _preloaded.is_set():
+        _preloaded.set()
+        _hash_pool.submit(_load_backends)
+
+
+async def _run_hashing(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent password operations, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        with phase("auth"):
+            return await asyncio.get_running_loop().run_in_executor(
+                _hash_pool, fn, *args
+            )
+    finally:
+        _hash_slots.release()
+
+
+async def aget_password_hash(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
+
+
+async def averify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    return await _run_hashing(
+        verify_and_update_password, plain_password, hashed_password
+    )
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
@@ -38,9 +167,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_current_user(
-    db: Session = Depends(get_session), token: str = Depends(oauth2_scheme)
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_session), token: str = Depends(oauth2_scheme)
 ) -> User:
+    with phase("auth"):
+        return await _resolve_user(db, token)
+
+
+async def _resolve_user(db: AsyncSession, token: str) -> User:
+    from jose import JWTError, jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -60,8 +196,12 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
+    user = user_cache.get(username)
     if user is None:
-        raise credentials_exception
+        user = await aget_user_by_username(db, username)
+        if user is None:
+            raise credentials_exception
+        user = _principal(user)
+        user_cache.set(username, user)
 
     return user
@@ -1,58 +1,179 @@
-from faker import Faker
-from decimal import Decimal
+import argparse
+import multiprocessing
 import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Optional
 
+from sqlalchemy import delete, insert, select
 from sqlalchemy.orm import Session
 
 from .database import SessionLocal
-from .models import Category, Expense
-
-fake = Faker()
+from .models import Category, Expense, ExpenseRollup, User
+from . import changes, rollups, search, versions
+from .pagination import count_cache
 
 CURRENCIES = ["USD", "EUR"]
+# Faker is slow per call (tens of µs), so rows draw from pools built once
+NAME_POOL_SIZE = 2000
+# created_at is spread over this window so monthly/daily summaries have shape
+HISTORY_SECONDS = 2 * 365 * 86400
+
+# Set in each generator process (or inline) by _init_generator
+_pool: dict = {}
+
+
+def _init_generator(category_ids, names, now, user_id=None):
+    _pool.update(category_ids=category_ids, names=names, now=now, user_id=user_id)
+
+
+def _generate_batch(task):
+    """Build ``size`` expense rows with a private RNG; runs in workers."""
+    size, seed = task
+    rng = random.Random(seed)
+    now, user_id = _pool["now"], _pool["user_id"]
+    created = [
+        now - timedelta(seconds=offset)
+        for offset in rng.choices(range(HISTORY_SECONDS), k=size)
+    ]
+    return [
+        {
+            "category_id": category_id,
+            "user_id": user_id,
+            "amount": Decimal(cents) / 100,
+            "currency": currency,
+            "name": name,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+        for category_id, cents, currency, name, created_at in zip(
+            rng.choices(_pool["category_ids"], k=size),
+            rng.choices(range(500, 50_001), k=size),
+            rng.choices(CURRENCIES, k=size),
+            rng.choices(_pool["names"], k=size),
+            created,
+        )
+    ]
 
 
-def seed_faker():
+def seed_faker(
+    rows: int = 200,
+    batch: int = 10_000,
+    workers: int = 1,
+    categories: int = 15,
+    user_id: Optional[int] = None,
+):
+    """Replace all expense data with Faker rows owned by ``user_id``."""
+    # Faker is the optional [seed] extra and slow to import; keep it off the API path
+    from faker import Faker
+
+    fake = Faker()
     db: Session = SessionLocal()
 
     print("Clearing existing data...")
-    db.query(Expense).delete()
-    db.query(Category).delete()
+    db.execute(delete(ExpenseRollup))
+    changes.clear(db)
+    # the name index is rebuilt in one pass after the load, not per row;
+    # created first in case the database predates it
+    search.create(db.connection())
+    search.drop_triggers(db.connection())
+    search.clear(db.connection())
+    db.execute(delete(Expense))
+    db.execute(delete(Category))
+    # writes around crud: move the stamps behind report ETags and the
+    # category cache ourselves
+    versions.bump(db, versions.EXPENSES)
+    versions.bump(db, versions.CATEGORIES)
     db.commit()
 
     print("Creating categories...")
-    category_names = [fake.word().capitalize() for _ in range(15)]
-
-    categories = [Category(name=name) for name in category_names]
-
-    db.add_all(categories)
+    category_ids = list(
+        db.scalars(
+            insert(Category).returning(Category.id),
+            [
+                {"name": fake.unique.word().capitalize(), "user_id": user_id}
+                for _ in range(categories)
+            ],
+        )
+    )
+    versions.bump(db, versions.CATEGORIES)
     db.commit()
 
-    # Fetch newly created categories with IDs
-    db.refresh(categories[0])
-    category_ids = [c.id for c in db.query(Category).all()]
-
-    print("Creating fake expenses...")
-
-    expenses = []
-    for _ in range(200):
-        amount = round(random.uniform(5, 500), 2)
-
-        expenses.append(
-            Expense(
-                amount=Decimal(str(amount)),
-                currency=random.choice(CURRENCIES),
-                name=fake.sentence(nb_words=8),
-                category_id=random.choice(category_ids),
+    print(f"Creating {rows:,} fake expenses...")
+    names = [fake.sentence(nb_words=8) for _ in range(NAME_POOL_SIZE)]
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    base_seed = random.randrange(2**32)
+    tasks = [
+        (min(batch, rows - start), base_seed + start) for start in range(0, rows, batch)
+    ]
+    init_args = (category_ids, names, now, user_id)
+
+    # Workers only generate; the parent does every INSERT, one transaction
+    # per batch, while the pool prepares the next batches.
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, _init_generator, init_args)
+        batches = pool.imap(_generate_batch, tasks)
+    else:
+        pool = None
+        _init_generator(*init_args)
+        batches = map(_generate_batch, tasks)
+
+    # Core executemany on the table skips the ORM bulk-insert bookkeeping
+    insert_expenses = insert(Expense.__table__)
+    started, inserted = time.perf_counter(), 0
+    try:
+        for chunk in batches:
+            db.connection().execute(insert_expenses, chunk)
+            db.commit()
+            inserted += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(
+                f"\r  {inserted:,}/{rows:,} rows, {inserted / elapsed:,.0f} rows/s",
+                end="",
+                file=sys.stderr,
+                flush=True,
             )
-        )
-
-    db.add_all(expenses)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if rows:
+        print(file=sys.stderr)
+
+    print("Building expense rollups...")
+    rollups.rebuild(db)  # bumps the expenses stamp again, now the load is done
+    changes.backfill(db, batch)
+    print("Indexing expense names...")
+    search.create(db.connection())
+    search.rebuild(db.connection())
     db.commit()
     db.close()
+    count_cache.invalidate()
 
     print("Database successfully populated with data")
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill the database with fake data")
+    parser.add_argument("--rows", type=int, default=200, help="expenses to create")
+    parser.add_argument("--batch", type=int, default=10_000, help="rows per INSERT")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="processes generating rows"
+    )
+    parser.add_argument("--categories", type=int, default=15)
+    parser.add_argument("--username", help="existing user to own the data")
+    args = parser.parse_args(argv)
+
+    user_id = None
+    if args.username:
+        with SessionLocal() as db:
+            user_id = db.scalar(select(User.id).where(User.username == args.username))
+        if user_id is None:
+            parser.error(f"no such user: {args.username}")
+    seed_faker(args.rows, args.batch, args.workers, args.categories, user_id)
+
+
 if __name__ == "__main__":
-    seed_faker()
+    main()
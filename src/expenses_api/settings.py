@@ -1,15 +1,78 @@
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict, Field, SecretStr
+from typing import Optional
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./expenses.db"
-    DEBUG: bool = True
+    # Driver URL for the async engine; derived from DATABASE_URL when unset
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # Also turns on SQL statement logging, so keep it off in production
+    DEBUG: bool = False
+
+    # Connection pool, for server databases (SQLite uses SQLAlchemy's defaults)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # PRAGMAs issued on every new SQLite connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_CACHE_SIZE: int = -65536  # negative = KiB, i.e. 64 MiB
+    SQLITE_MMAP_SIZE: int = 268_435_456
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
 
     SECRET_KEY: SecretStr = Field(default="secret-key")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # argon2id cost; hashes made with other values are upgraded on login
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+    # Dedicated password hashing pool and how many calls may wait for it
+    HASH_POOL_WORKERS: int = 2
+    HASH_QUEUE_LIMIT: int = 32
+
+    # Verified principals kept per worker; changes made through another
+    # worker are seen once the entry expires
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_SIZE: int = 10_000
+
+    # Users whose category list is kept per worker (0 disables caching)
+    CATEGORY_CACHE_MAX_SIZE: int = 10_000
+
+    # Seconds a list total may be served from cache (0 disables caching),
+    # and how many filter sets are kept per worker
+    COUNT_CACHE_TTL_SECONDS: int = 30
+    COUNT_CACHE_MAX_SIZE: int = 10_000
+
+    # GET /expenses?ids=: most ids one request may ask for
+    MULTI_GET_MAX_IDS: int = 200
+
+    # GET /expenses/changes: deletions are reported for this long; clients
+    # that have not synced since get a 410 and start over
+    CHANGES_RETENTION_DAYS: int = 30
+
+    # POST /expenses/bulk: rows per INSERT/transaction and rows per request
+    BULK_CHUNK_SIZE: int = 1000
+    BULK_MAX_ROWS: int = 200_000
+
+    # Request timing, SQL counters and /metrics (Prometheus text format)
+    INSTRUMENTATION_ENABLED: bool = False
+    # Bearer token scrapers send to /metrics; without one it stays off
+    METRICS_TOKEN: Optional[SecretStr] = None
+    # Statements at least this slow are logged on "expenses_api.sql"
+    SLOW_QUERY_MS: float = 100
+
+    # fx_rates hold units of each currency per one base unit. Until rates
+    # are loaded, only these currencies are accepted
+    FX_BASE_CURRENCY: str = "EUR"
+    DEFAULT_CURRENCIES: list[str] = ["EUR", "USD"]
+
+    # GET /expenses/export: rows fetched per round-trip while streaming
+    EXPORT_BATCH_SIZE: int = 2000
+
     model_config = ConfigDict(env_file=".env", extra="ignore")
 
 
@@ -1,27 +1,49 @@
+import sys
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
 from fastapi.testclient import TestClient
 
-from expenses_api.database import Base
-from expenses_api.deps import get_session
+from expenses_api import deps, migrations
+from expenses_api.database import engine_options, set_sqlite_pragmas
+from expenses_api.deps import get_async_session, get_session
 
 from expenses_api.main import app
 from expenses_api.models import User
-from expenses_api.security import get_password_hash
+from expenses_api.security import get_password_hash, user_cache
 from expenses_api import models
 from expenses_api import crud
+from expenses_api.fx import rate_table
+from expenses_api.crud import category_cache
+from expenses_api.pagination import count_cache
 
 
 @pytest.fixture(scope="session")
-def engine():
+def engine(tmp_path_factory):
+    # a file, not :memory:, so the app's startup thread sees the same database
+    path = tmp_path_factory.mktemp("db") / "test.db"
     engine = create_engine(
-        "sqlite:///:memory:",
-        connect_args={"check_same_thread": False},
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}
     )
-    Base.metadata.create_all(bind=engine)
+    migrations.migrate(engine)
     yield engine
-    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    # process-wide caches would otherwise leak between rolled-back tests
+    count_cache.invalidate()
+    user_cache.clear()
+    rate_table.clear()
+    category_cache.clear()
+    yield
+    count_cache.invalidate()
+    user_cache.clear()
+    rate_table.clear()
+    category_cache.clear()
 
 
 @pytest.fixture(scope="function")
@@ -40,16 +62,50 @@ def db(engine):
         yield session
     finally:
         session.close()
-        transaction.rollback()
+        # a crud rollback (e.g. after an IntegrityError) may have ended it
+        if transaction.is_active:
+            transaction.rollback()
         connection.close()
 
 
+class SyncSessionAdapter:
+    """Stands in for an AsyncSession so async routes share the test session.
+
+    Routes only reach the database through the ``crud.a*`` entry points,
+    which go through ``run_sync`` (or ``stream`` for exports).
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.sync_session, *args, **kwargs)
+
+    async def stream(self, statement):
+        return AsyncResultAdapter(self.sync_session.execute(statement))
+
+
+class AsyncResultAdapter:
+    def __init__(self, result):
+        self.result = result
+
+    async def partitions(self, size=None):
+        for partition in self.result.partitions(size):
+            yield partition
+
+
 @pytest.fixture(scope="function")
-def client(db):
+def client(db, engine, monkeypatch):
     def override_get_db():
         yield db
 
+    async def override_get_async_db():
+        yield SyncSessionAdapter(db)
+
     app.dependency_overrides[get_session] = override_get_db
+    app.dependency_overrides[get_async_session] = override_get_async_db
+    # the startup check must not touch ./expenses.db
+    monkeypatch.setattr(sys.modules["expenses_api.main"], "engine", engine)
 
     with TestClient(app) as test_client:
         yield test_client
@@ -57,6 +113,34 @@ def client(db):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def async_client(tmp_path, monkeypatch):
+    """A client whose routes get real AsyncSessions from an aiosqlite engine.
+
+    Requests commit for real, so they get a database file of their own.
+    """
+    path = tmp_path / "async.db"
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.migrate(engine)
+    async_url = f"sqlite+aiosqlite:///{path}"
+    async_engine = create_async_engine(async_url, **engine_options(async_url))
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    monkeypatch.setattr(
+        deps,
+        "AsyncSessionLocal",
+        async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False),
+    )
+    main = sys.modules["expenses_api.main"]
+    monkeypatch.setattr(main, "engine", engine)
+    # disposed by the lifespan, on the loop that opened its connections
+    monkeypatch.setattr(main, "async_engine", async_engine)
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+    engine.dispose()
+
+
 @pytest.fixture
 def test_user(db):
     user = User(
@@ -1,11 +1,24 @@
+import asyncio
 import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+import threading
+import sys
 import time
 
+from sqlalchemy import create_engine, event, func, insert, select
+
+from expenses_api.database import Base, set_sqlite_pragmas
+
 from expenses_api import models
+from expenses_api import changes
 from expenses_api import crud
+from expenses_api import fx
+from expenses_api import rollups
+from expenses_api import versions
+from expenses_api.pagination import CountCache
 
 # --- PYTEST FIXTURES FOR DB SETUP  ---
 
@@ -38,6 +51,69 @@ def test_list_categories_ordered(db):
     assert categories[1].name == "Categorie_B"
 
 
+def test_list_categories_cached_until_a_write(db):
+    rent = crud.create_category(db, name="Rent")
+    assert [c.name for c in crud.list_categories(db)] == ["Rent"]
+
+    selects = []
+    listen = lambda *args: selects.append(args[2])  # noqa: E731
+    event.listen(db.get_bind(), "before_cursor_execute", listen)
+    try:
+        assert [c.id for c in crud.list_categories(db)] == [rent.id]
+        # only the categories stamp was read
+        assert len(selects) == 1 and "data_versions" in selects[0]
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listen)
+
+    # a write made elsewhere (another worker) is seen through the stamp
+    db.execute(insert(models.Category).values(name="Food", normalized_name="food"))
+    versions.bump(db, versions.CATEGORIES)
+    assert [c.name for c in crud.list_categories(db)] == ["Food", "Rent"]
+
+    crud.delete_category(db, rent.id)
+    assert [c.name for c in crud.list_categories(db)] == ["Food"]
+    stats = crud.category_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stale"]) == (1, 3, 2)
+
+
+def test_create_category_duplicate_any_case(db):
+    crud.create_category(db, name="Épicerie")
+
+    with pytest.raises(ValueError):
+        crud.create_category(db, name="  ÉPICERIE ")
+    assert crud.get_category_by_name(db, "épicerie").name == "Épicerie"
+
+
+def test_create_category_duplicate_race_hits_constraint(db, monkeypatch):
+    crud.create_category(db, name="Rent")
+    # as if another request inserted it after our existence check
+    monkeypatch.setattr(crud, "get_category_by_name", lambda *args: None)
+
+    with pytest.raises(ValueError):
+        crud.create_category(db, name="rent")
+
+
+def test_data_is_scoped_to_its_owner(db):
+    alice = models.User(username="alice", hashed_password="x")
+    bob = models.User(username="bob", hashed_password="x")
+    db.add_all([alice, bob])
+    db.flush()
+    # the same name is free for each owner
+    mine = crud.create_category(db, name="Rent", user_id=alice.id)
+    theirs = crud.create_category(db, name="rent", user_id=bob.id)
+    expense = crud.create_expense(db, mine.id, Decimal("10.00"), "EUR")
+    crud.create_expense(db, theirs.id, Decimal("99.00"), "EUR")
+
+    assert expense.user_id == alice.id
+    assert [c.id for c in crud.list_categories(db, user_id=alice.id)] == [mine.id]
+    assert crud.get_category(db, theirs.id, user_id=alice.id) is None
+    assert crud.get_expense(db, expense.id, user_id=bob.id) is None
+    items, total = crud.list_expenses(db, user_id=alice.id)
+    assert total == 1 and items[0].id == expense.id
+    rows = crud.summary_by_category(db, user_id=alice.id)
+    assert [(r["key"], r["total_amount"]) for r in rows] == [("Rent", Decimal("10.00"))]
+
+
 def test_delete_category_success(db: Session):
     category = crud.create_category(db, name="ToDelete")
     category_id = category.id
@@ -69,6 +145,77 @@ def test_get_expense_not_found(db: Session):
     assert expense is None
 
 
+def test_get_expenses_in_one_query(db: Session, test_category: models.Category):
+    owner = models.User(username="owner", hashed_password="x")
+    db.add(owner)
+    db.flush()
+    mine = crud.create_category(db, name="Mine", user_id=owner.id)
+    first = crud.create_expense(db, mine.id, Decimal("1.00"), "EUR")
+    second = crud.create_expense(db, mine.id, Decimal("2.00"), "EUR")
+    foreign = crud.create_expense(db, test_category.id, Decimal("3.00"), "EUR")
+    owner_id, first_id, second_id = owner.id, first.id, second.id
+    foreign_id = foreign.id
+    db.expire_all()
+
+    selects = []
+    listen = lambda *args: selects.append(args[2])  # noqa: E731
+    event.listen(db.get_bind(), "before_cursor_execute", listen)
+    try:
+        items, missing = crud.get_expenses(
+            db, [second_id, 999, first_id, second_id, foreign_id], owner_id
+        )
+        assert [e.id for e in items] == [second_id, first_id]
+        assert missing == [999, foreign_id]
+        assert len(selects) == 1
+
+        # loaded expenses now come from the session's identity map
+        crud.get_expenses(db, [first_id, second_id], owner_id)
+        assert len(selects) == 1
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listen)
+
+
+def test_change_feed_keeps_latest_change_per_expense(
+    db: Session, test_category: models.Category
+):
+    dropped = crud.create_expense(db, test_category.id, Decimal("2.00"), "EUR")
+    kept = crud.create_expense(db, test_category.id, Decimal("1.00"), "EUR")
+    kept_id, dropped_id = kept.id, dropped.id
+    watermark = crud.expense_changes(db).next_since
+
+    crud.update_expense(db, kept_id, {"amount": Decimal("3.00")})
+    crud.delete_expense(db, dropped_id)
+    (added,) = crud.bulk_create_expenses(
+        db, [{"category_id": test_category.id, "amount": 4, "currency": "eur"}]
+    )
+
+    feed = crud.expense_changes(db, since=watermark)
+    assert [(row.op, row.expense_id) for row in feed.items] == [
+        ("upsert", kept_id),
+        ("delete", dropped_id),
+        ("upsert", added),
+    ]
+    assert feed.items[0].amount == Decimal("3.00")
+    assert feed.items[1].amount is None
+    # from scratch: one row per expense, in change order
+    assert [row.expense_id for row in crud.expense_changes(db).items] == [
+        kept_id,
+        dropped_id,
+        added,
+    ]
+    assert crud.expense_changes(db, since=feed.next_since).items == []
+
+    page = crud.expense_changes(db, since=watermark, limit=2)
+    assert page.has_more and len(page.items) == 2
+
+    assert changes.compact(db, timedelta(0)) == 1
+    with pytest.raises(ValueError, match="expired"):
+        crud.expense_changes(db, since=watermark)
+    current = crud.expense_changes(db, since=feed.next_since)
+    assert current.items == [] and current.next_since == feed.next_since
+    assert [row.op for row in crud.expense_changes(db).items] == ["upsert"] * 2
+
+
 def test_update_expense_success(db: Session, test_category: models.Category):
     expense = crud.create_expense(
         db, category_id=test_category.id, amount=Decimal("10.00"), currency="USD"
@@ -133,6 +280,94 @@ def test_list_expenses_with_filters(db: Session, test_category: models.Category)
     assert total == 0
 
 
+def test_paginate_expenses_keyset_walks_both_ways(
+    db: Session, test_category: models.Category
+):
+    ids = [
+        crud.create_expense(db, test_category.id, Decimal(i + 1), "EUR").id
+        for i in range(7)
+    ]
+    newest_first = list(reversed(ids))
+
+    first = crud.paginate_expenses(db, size=3)
+    assert [e.id for e in first.items] == newest_first[:3]
+    assert first.prev_cursor is None
+    assert first.total is None
+
+    second = crud.paginate_expenses(db, size=3, cursor=first.next_cursor)
+    assert [e.id for e in second.items] == newest_first[3:6]
+
+    last = crud.paginate_expenses(db, size=3, cursor=second.next_cursor)
+    assert [e.id for e in last.items] == newest_first[6:]
+    assert last.next_cursor is None
+
+    back = crud.paginate_expenses(db, size=3, cursor=last.prev_cursor)
+    assert [e.id for e in back.items] == newest_first[3:6]
+
+    back = crud.paginate_expenses(db, size=3, cursor=back.prev_cursor)
+    assert [e.id for e in back.items] == newest_first[:3]
+    assert back.prev_cursor is None
+
+
+def test_paginate_expenses_invalid_cursor(db: Session):
+    with pytest.raises(ValueError, match="invalid cursor"):
+        crud.paginate_expenses(db, cursor="not-a-cursor")
+
+
+def test_search_ranks_matches_and_follows_writes(
+    db: Session, test_category: models.Category
+):
+    def found(text, **filters):
+        items, total = crud.list_expenses(db, search_text=text, **filters)
+        assert total == len(items)
+        return [item.id for item in items]
+
+    lunch = crud.create_expense(db, test_category.id, Decimal("12"), "EUR", "Lunch")
+    cafe = crud.create_expense(
+        db, test_category.id, Decimal("4"), "EUR", "Café with lunch guests"
+    )
+    train = crud.create_expense(db, test_category.id, Decimal("30"), "EUR", "Train")
+
+    # the shorter name is the better match; accents and case are ignored
+    assert found("LUNCH") == [lunch.id, cafe.id]
+    assert found("cafe lun") == [cafe.id]
+    assert found("lunch", min_amount=Decimal("10")) == [lunch.id]
+    # operators and quotes are plain text
+    assert found('lunch OR "train') == []
+
+    crud.update_expense(db, train.id, {"name": "Train to lunch"})
+    crud.delete_expense(db, lunch.id)
+    assert found("lunch") == [train.id, cafe.id]
+    assert found("train") == [train.id]
+
+    with pytest.raises(ValueError):
+        crud.list_expenses(db, search_text="?!")
+    with pytest.raises(ValueError):
+        crud.paginate_expenses(db, cursor="x", search_text="lunch")
+
+
+def test_count_expenses_cache_invalidated_on_write(
+    db: Session, test_category: models.Category
+):
+    crud.create_expense(db, test_category.id, Decimal("10.00"), "EUR")
+    assert crud.count_expenses(db) == 1
+
+    crud.create_expense(db, test_category.id, Decimal("20.00"), "EUR")
+    assert crud.count_expenses(db) == 2
+
+
+def test_count_cache_is_bounded():
+    cache = CountCache(max_size=2, ttl_seconds=60)
+    for total, key in enumerate(["a", "b", "c"]):
+        cache.set(key, total)
+
+    assert cache.get("a") is None  # least recently used, evicted
+    assert cache.get("c") == 2
+    assert cache.stats()["size"] == 2 and cache.stats()["evictions"] == 1
+    cache.invalidate()
+    assert cache.get("c") is None
+
+
 def test_summary_by_category(db: Session, test_category: models.Category):
     cat_id = test_category.id
     crud.create_category(db, name="Transport")
@@ -155,3 +390,278 @@ def test_summary_by_category(db: Session, test_category: models.Category):
         return (d["key"], d["currency"])
 
     assert sorted(summary, key=sort_key) == sorted(expected, key=sort_key)
+
+
+def _rollup_rows(db: Session):
+    rows = db.execute(select(models.ExpenseRollup)).scalars().all()
+    return sorted(
+        (
+            r.month,
+            r.category_id,
+            r.currency,
+            r.total_amount,
+            r.expense_count,
+            r.min_amount,
+            r.max_amount,
+        )
+        for r in rows
+    )
+
+
+def test_rollups_follow_expense_writes(db: Session, test_category: models.Category):
+    transport = crud.create_category(db, name="Transport")
+    cheap = crud.create_expense(db, test_category.id, Decimal("5.00"), "USD")
+    crud.create_expense(db, test_category.id, Decimal("10.00"), "USD")
+    moved = crud.create_expense(db, test_category.id, Decimal("30.00"), "USD")
+    crud.create_expense(db, transport.id, Decimal("8.00"), "EUR")
+
+    crud.update_expense(
+        db, moved.id, {"amount": Decimal("7.00"), "category_id": transport.id}
+    )
+    crud.delete_expense(db, cheap.id)
+
+    buckets = {(r[1], r[2]): r[3:] for r in _rollup_rows(db)}
+    assert buckets[(test_category.id, "USD")] == (
+        Decimal("10.00"),
+        1,
+        Decimal("10.00"),
+        Decimal("10.00"),
+    )
+    assert buckets[(transport.id, "USD")][:2] == (Decimal("7.00"), 1)
+
+    incremental = _rollup_rows(db)
+    rollups.rebuild(db)
+    assert _rollup_rows(db) == incremental
+
+
+@pytest.mark.parametrize(
+    "first_write, final_total",
+    [("update", Decimal("25.00")), ("delete", Decimal("5.00"))],
+)
+def test_rollups_exact_under_concurrent_writes(
+    tmp_path, monkeypatch, first_write, final_total
+):
+    # two sessions on a WAL file; the second one writes right after the
+    # first one read its snapshot, and must wait for it to commit
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as setup:
+        category = crud.create_category(setup, name="Food")
+        expense_id = crud.create_expense(setup, category.id, Decimal("10"), "EUR").id
+        # keeps the bucket alive whatever happens to the other one
+        crud.create_expense(setup, category.id, Decimal("5"), "EUR")
+
+    def other_writer():
+        with Session(engine) as db:
+            crud.update_expense(db, expense_id, {"amount": Decimal("20")})
+
+    real_snapshot = rollups.snapshot
+    writer = threading.Thread(target=other_writer)
+
+    def snapshot_then_race(db, expense_id):
+        old = real_snapshot(db, expense_id)
+        if not writer.is_alive() and writer.ident is None:
+            monkeypatch.setattr(rollups, "snapshot", real_snapshot)
+            writer.start()
+            writer.join(0.5)  # blocked on the lock until we commit
+        return old
+
+    monkeypatch.setattr(rollups, "snapshot", snapshot_then_race)
+    with Session(engine) as db:
+        if first_write == "update":
+            crud.update_expense(db, expense_id, {"amount": Decimal("1")})
+        else:
+            crud.delete_expense(db, expense_id)
+    writer.join()
+
+    with Session(engine) as db:
+        incremental = _rollup_rows(db)
+        rollups.rebuild(db)
+        assert _rollup_rows(db) == incremental
+        # the other update ran after ours, or found the expense deleted
+        assert db.scalar(select(func.sum(models.Expense.amount))) == final_total
+    engine.dispose()
+
+
+def test_bulk_create_expenses_updates_rollups(
+    db: Session, test_category: models.Category
+):
+    rows = [
+        {"category_id": test_category.id, "amount": Decimal(i), "currency": "usd"}
+        for i in range(1, 6)
+    ]
+    ids = crud.bulk_create_expenses(db, rows)
+
+    assert len(ids) == 5
+    assert [crud.get_expense(db, i).amount for i in ids] == [1, 2, 3, 4, 5]
+    assert crud.summary_by_currency(db) == [
+        {"key": "USD", "currency": "USD", "total_amount": Decimal("15.00")}
+    ]
+
+
+def test_summary_by_month(db: Session, test_category: models.Category):
+    crud.create_expense(db, test_category.id, Decimal("10.00"), "USD")
+    crud.create_expense(db, test_category.id, Decimal("15.00"), "USD")
+    expense = crud.create_expense(db, test_category.id, Decimal("50.00"), "EUR")
+    crud.delete_expense(db, expense.id)
+
+    month = expense.created_at.strftime("%Y-%m")
+    assert crud.summary_by_month(db) == [
+        {"key": month, "currency": "USD", "total_amount": Decimal("25.00")}
+    ]
+
+
+# --- TESTS FOR EXCHANGE RATES ---
+
+
+def test_parse_rates_rejects_bad_rows():
+    rows = fx.parse_rates(["date,currency,rate", "2024-01-02,usd,1.10"])
+    assert rows == [
+        {"currency": "USD", "rate_date": date(2024, 1, 2), "rate": Decimal("1.10")}
+    ]
+    for bad in ("2024-13-01,USD,1", "2024-01-02,US,1", "2024-01-02,USD,0"):
+        with pytest.raises(ValueError, match="line 2"):
+            fx.parse_rates(["date,currency,rate", bad])
+
+
+def test_supported_currencies_follow_the_rate_table(db: Session):
+    assert crud.supported_currencies(db) == {"EUR", "USD"}
+
+    fx.load_rates(db, fx.parse_rates(["date,currency,rate", "2024-01-02,GBP,0.85"]))
+
+    assert crud.supported_currencies(db) == {"EUR", "GBP"}
+
+
+def test_summary_converts_at_the_rate_of_each_day(
+    db: Session, test_category: models.Category
+):
+    fx.load_rates(
+        db,
+        fx.parse_rates(["date,currency,rate", "2022-01-01,USD,2", "2024-01-01,USD,4"]),
+    )
+    db.connection().execute(
+        insert(models.Expense.__table__),
+        [
+            {
+                "category_id": test_category.id,
+                "amount": Decimal("8.00"),
+                "currency": currency,
+                "created_at": created_at,
+            }
+            for currency, created_at in [
+                ("USD", datetime(2021, 6, 1)),  # before the first rate
+                ("USD", datetime(2023, 6, 1)),
+                ("USD", datetime(2025, 6, 1)),
+                ("EUR", datetime(2025, 6, 1)),
+            ]
+        ],
+    )
+
+    by_month = crud.summary_by_month(db, target_currency="EUR")
+    assert by_month == [
+        {"key": "2025-06", "currency": "EUR", "total_amount": Decimal("10.00")},
+        {"key": "2023-06", "currency": "EUR", "total_amount": Decimal("4.00")},
+        {"key": "2021-06", "currency": "EUR", "total_amount": Decimal("4.00")},
+    ]
+    assert crud.summary_by_currency(db, target_currency="USD") == [
+        {"key": "EUR", "currency": "USD", "total_amount": Decimal("32.00")},
+        {"key": "USD", "currency": "USD", "total_amount": Decimal("24.00")},
+    ]
+
+
+def test_converted_totals_round_to_the_minor_unit(
+    db: Session, test_category: models.Category
+):
+    fx.load_rates(
+        db,
+        fx.parse_rates(
+            ["date,currency,rate", "2024-01-01,USD,3", "2024-01-01,JPY,160.5"]
+        ),
+    )
+    for amount, currency in [("10.00", "USD"), ("10.00", "USD"), ("10.01", "EUR")]:
+        crud.create_expense(db, test_category.id, Decimal(amount), currency)
+
+    # 20 USD is 6.666... EUR: rounded once, on the total
+    assert crud.summary_by_currency(db, target_currency="EUR") == [
+        {"key": "EUR", "currency": "EUR", "total_amount": Decimal("10.01")},
+        {"key": "USD", "currency": "EUR", "total_amount": Decimal("6.67")},
+    ]
+    (row,) = crud.summary_by_category(db, target_currency="JPY")
+    assert row["total_amount"] == Decimal("2677")
+    assert str(row["total_amount"]) == "2677"
+
+
+# --- TESTS FOR THE ASYNC ENTRY POINTS ---
+
+
+def test_async_crud_roundtrip():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            category = await crud.acreate_category(db, "Travel")
+            expense = await crud.acreate_expense(
+                db, category.id, Decimal("42.00"), "eur", "Train"
+            )
+            fetched = await crud.aget_expense(db, expense.id)
+            items, total = await crud.alist_expenses(db, category_id=category.id)
+            await crud.adelete_expense(db, expense.id)
+            gone = await crud.aget_expense(db, expense.id)
+
+        await engine.dispose()
+        return fetched, items, total, gone
+
+    fetched, items, total, gone = asyncio.run(scenario())
+
+    assert fetched.currency == "EUR"
+    assert fetched.amount == Decimal("42.00")
+    assert total == 1
+    assert [e.id for e in items] == [fetched.id]
+    assert gone is None
+
+
+# --- TESTS FOR THE BULK SEEDER ---
+
+
+def test_seed_moves_the_stamps(db, monkeypatch):
+    from expenses_api import seed
+
+    crud.create_category(db, name="Food")
+    assert [c.name for c in crud.list_categories(db)] == ["Food"]
+    before = crud.report_versions(db)
+
+    monkeypatch.setattr(seed, "SessionLocal", lambda: db)
+    seed.seed_faker(rows=30, batch=10, categories=3)
+
+    after = crud.report_versions(db)
+    for name in (versions.EXPENSES, versions.CATEGORIES):
+        assert after[name].version > before[name].version
+    # the cached list is not served past the reseed
+    assert "Food" not in [c.name for c in crud.list_categories(db)]
+    assert crud.count_expenses(db) == 30
+
+
+def test_seed_without_faker_names_the_extra(monkeypatch):
+    from expenses_api import cli
+
+    monkeypatch.setitem(sys.modules, "faker", None)
+    with pytest.raises(SystemExit, match=r"expenses-api\[seed\]"):
+        cli.main(["seed", "--rows", "1"])
+
+
+def test_seed_batches_insert_and_roll_up(db, test_category):
+    from expenses_api import seed
+
+    seed._init_generator([test_category.id], ["Lunch"], datetime(2025, 6, 1))
+    rows = seed._generate_batch((500, 42))
+    assert rows == seed._generate_batch((500, 42))  # same seed, same rows
+    assert {row["currency"] for row in rows} <= set(seed.CURRENCIES)
+
+    db.connection().execute(insert(models.Expense.__table__), rows)
+    rollups.rebuild(db)
+    assert crud.count_expenses(db) == 500
+    total = sum(row["total_amount"] for row in crud.summary_by_currency(db))
+    assert total == sum(row["amount"] for row in rows)
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+from sqlalchemy import create_engine, event, text
+
+from expenses_api.database import engine_options, set_sqlite_pragmas
+
+
+def test_sqlite_pragmas_applied_on_connect(tmp_path):
+    url = f"sqlite:///{tmp_path / 'pragmas.db'}"
+    engine = create_engine(url, **engine_options(url))
+    event.listen(engine, "connect", set_sqlite_pragmas)
+
+    with engine.connect() as conn:
+        pragma = lambda name: conn.execute(text(f"PRAGMA {name}")).scalar()  # noqa: E731
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == 5000
+    engine.dispose()
+
+
+def test_server_engine_gets_pool_settings():
+    options = engine_options("postgresql://user:pw@localhost/expenses")
+    assert options["pool_size"] == 5
+    assert options["pool_pre_ping"] is True
+    assert "connect_args" not in options
+    assert options["echo"] is False
+
+
+def test_importing_the_app_skips_heavy_modules():
+    code = (
+        "import sys, expenses_api.main; "
+        "print(' '.join(m for m in ('faker', 'passlib', 'jose') if m in sys.modules))"
+    )
+    loaded = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.split()
+    assert loaded == []
@@ -0,0 +1,175 @@
+from decimal import Decimal
+import threading
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from expenses_api import crud, migrations
+from expenses_api.database import Base
+from expenses_api.models import User
+
+# What create_all produced a few releases back: UNIQUE(name) on categories,
+# no owners, rollups keyed without an owner and the first expense indexes.
+LEGACY_DDL = """
+CREATE TABLE users (
+    id INTEGER NOT NULL, username VARCHAR(50) NOT NULL,
+    hashed_password VARCHAR NOT NULL, is_active BOOLEAN DEFAULT 1 NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_users_id ON users (id);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE TABLE categories (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    PRIMARY KEY (id), UNIQUE (name)
+);
+CREATE INDEX ix_categories_id ON categories (id);
+CREATE TABLE expenses (
+    id INTEGER NOT NULL, category_id INTEGER NOT NULL,
+    amount NUMERIC(12, 2) NOT NULL, currency VARCHAR(3) NOT NULL,
+    name VARCHAR(500), created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    PRIMARY KEY (id),
+    FOREIGN KEY(category_id) REFERENCES categories (id) ON DELETE RESTRICT
+);
+CREATE INDEX ix_expenses_id ON expenses (id);
+CREATE INDEX ix_expenses_created_at_id ON expenses (created_at, id);
+CREATE TABLE expense_rollups (
+    month VARCHAR(7) NOT NULL, category_id INTEGER NOT NULL,
+    currency VARCHAR(3) NOT NULL, total_amount NUMERIC(18, 2) NOT NULL,
+    expense_count INTEGER NOT NULL, min_amount NUMERIC(12, 2) NOT NULL,
+    max_amount NUMERIC(12, 2) NOT NULL,
+    PRIMARY KEY (month, category_id, currency)
+);
+INSERT INTO categories (id, name) VALUES (1, 'Food'), (2, 'food'), (3, 'Rent');
+INSERT INTO expenses (category_id, amount, currency, name, created_at) VALUES
+    (1, 10, 'EUR', 'Lunch', '2024-05-01 10:00:00'),
+    (3, 700, 'EUR', 'May rent', '2024-05-02 10:00:00');
+"""
+
+
+def _schema(engine):
+    inspector = inspect(engine)
+    with engine.connect() as connection:
+        indexes = connection.execute(
+            text("SELECT tbl_name, name FROM sqlite_master WHERE type = 'index'")
+        ).all()
+    return {
+        table: (
+            {column["name"] for column in inspector.get_columns(table)},
+            {name for tbl_name, name in indexes if tbl_name == table},
+        )
+        for table in inspector.get_table_names()
+    }
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        for statement in LEGACY_DDL.split(";"):
+            if statement.strip():
+                connection.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+def test_new_database_is_created_at_head(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+
+    assert migrations.check(engine) is True
+    assert migrations.current_version(engine) == migrations.HEAD
+    assert migrations.check(engine) is False
+    engine.dispose()
+
+
+def test_workers_booting_on_a_new_database(tmp_path):
+    # as if several workers ran the startup check on the same new file
+    engines = [create_engine(f"sqlite:///{tmp_path / 'new.db'}") for _ in range(4)]
+    barrier = threading.Barrier(len(engines))
+    results, errors = [], []
+
+    def boot(engine):
+        barrier.wait()
+        try:
+            results.append(migrations.check(engine))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=boot, args=(e,)) for e in engines]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(results) == [False, False, False, True]
+    with engines[0].connect() as connection:
+        versions = connection.scalars(text("SELECT version FROM schema_migrations"))
+        assert sorted(versions) == [m.version for m in migrations.MIGRATIONS]
+    for engine in engines:
+        engine.dispose()
+
+
+def test_startup_check_refuses_pending_migrations(legacy_engine):
+    with pytest.raises(RuntimeError, match="expenses-api migrate"):
+        migrations.check(legacy_engine)
+
+
+def test_legacy_database_migrates_to_the_models(legacy_engine, tmp_path):
+    applied = migrations.migrate(legacy_engine)
+
+    assert [step.version for step in applied] == [
+        m.version for m in migrations.MIGRATIONS
+    ]
+    reference = create_engine(f"sqlite:///{tmp_path / 'reference.db'}")
+    Base.metadata.create_all(bind=reference)
+    assert _schema(legacy_engine) == _schema(reference)
+    reference.dispose()
+
+    with Session(legacy_engine) as db:
+        # names that only differed by case survive the new unique index
+        assert [c.name for c in crud.list_categories(db)] == ["Food", "Rent", "food"]
+        assert crud.get_category_by_name(db, "FOOD").id == 1
+        # rollups were rebuilt under the new key
+        assert crud.summary_by_month(db) == [
+            {"key": "2024-05", "currency": "EUR", "total_amount": Decimal("710.00")}
+        ]
+        # existing expenses are in the sync feed
+        feed = crud.expense_changes(db)
+        assert [(row.op, row.expense_id) for row in feed.items] == [
+            ("upsert", 1),
+            ("upsert", 2),
+        ]
+        # existing names are searchable
+        items, _ = crud.list_expenses(db, search_text="rent")
+        assert [item.id for item in items] == [2]
+
+    assert migrations.migrate(legacy_engine) == []
+    assert migrations.check(legacy_engine) is False
+
+
+def test_ownerless_data_is_assigned_to_a_user(legacy_engine):
+    migrations.migrate(legacy_engine)
+    with Session(legacy_engine) as db:
+        owner = User(username="owner", hashed_password="-")
+        db.add(owner)
+        db.commit()
+        crud.create_category(db, "rent", user_id=owner.id)
+        owner_id = owner.id
+
+    assert migrations.assign_owner(legacy_engine, owner_id) == (3, 2)
+
+    with Session(legacy_engine) as db:
+        names = [c.name for c in crud.list_categories(db, user_id=owner_id)]
+        # the user's own "rent" and the legacy "Rent" both survive
+        assert sorted(names) == ["Food", "Rent", "food", "rent"]
+        assert crud.get_category_by_name(db, "rent", user_id=owner_id).id == 4
+        assert crud.summary_by_month(db, user_id=owner_id) == [
+            {"key": "2024-05", "currency": "EUR", "total_amount": Decimal("710.00")}
+        ]
+        feed = crud.expense_changes(db, user_id=owner_id)
+        assert sorted(row.expense_id for row in feed.items) == [1, 2]
+
+    assert migrations.assign_owner(legacy_engine, owner_id) == (0, 0)
@@ -0,0 +1,169 @@
+import re
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from expenses_api import crud
+
+# EXPLAIN QUERY PLAN guard: every query crud issues must be answered from an
+# index. A bare "SCAN <table>" (no USING ...) is a full table scan.
+
+TABLE_SCAN = re.compile(r"^SCAN (TABLE )?(\w+)$")
+
+
+@pytest.fixture
+def statements(engine):
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(engine, "before_cursor_execute", capture)
+
+
+@pytest.fixture
+def dataset(db, test_user):
+    # API queries are always scoped to the current user
+    category = crud.create_category(db, "Groceries", user_id=test_user.id)
+    for i in range(5):
+        crud.create_expense(db, category.id, Decimal(10 * (i + 1)), "EUR")
+    return category
+
+
+def query_plan(db, statement, parameters):
+    rows = db.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statement, parameters
+    )
+    return [row[3] for row in rows]
+
+
+def _second_page(db, **filters):
+    first = crud.paginate_expenses(db, size=2, **filters)
+    return crud.paginate_expenses(db, size=2, cursor=first.next_cursor, **filters)
+
+
+QUERIES = {
+    "get_expense": lambda db, cat: crud.get_expense(db, 1, user_id=cat.user_id),
+    "get_expenses": lambda db, cat: crud.get_expenses(
+        db, [1, 2, 3], user_id=cat.user_id
+    ),
+    "expense_changes": lambda db, cat: crud.expense_changes(
+        db, since=1, user_id=cat.user_id
+    ),
+    "list_categories": lambda db, cat: crud.list_categories(db, user_id=cat.user_id),
+    "get_category_by_name": lambda db, cat: crud.get_category_by_name(
+        db, "FOOD", user_id=cat.user_id
+    ),
+    "list_expenses": lambda db, cat: crud.list_expenses(db, user_id=cat.user_id),
+    "list_expenses_page_2": lambda db, cat: crud.list_expenses(
+        db, user_id=cat.user_id, page=2, size=2
+    ),
+    "list_expenses_category": lambda db, cat: crud.list_expenses(
+        db, user_id=cat.user_id, category_id=cat.id
+    ),
+    "list_expenses_amount_range": lambda db, cat: crud.list_expenses(
+        db, user_id=cat.user_id, min_amount=Decimal("15"), max_amount=Decimal("35")
+    ),
+    "list_expenses_all_filters": lambda db, cat: crud.list_expenses(
+        db,
+        user_id=cat.user_id,
+        category_id=cat.id,
+        min_amount=Decimal("15"),
+        max_amount=Decimal("35"),
+    ),
+    "list_expenses_date_range": lambda db, cat: crud.list_expenses(
+        db,
+        user_id=cat.user_id,
+        from_dt=datetime(2020, 1, 1),
+        to_dt=datetime(2100, 1, 1),
+    ),
+    "list_expenses_date_range_category": lambda db, cat: crud.list_expenses(
+        db, user_id=cat.user_id, from_dt=datetime(2020, 1, 1), category_id=cat.id
+    ),
+    "list_expenses_date_range_amount": lambda db, cat: crud.list_expenses(
+        db, user_id=cat.user_id, to_dt=datetime(2100, 1, 1), min_amount=Decimal("15")
+    ),
+    "list_expenses_search": lambda db, cat: crud.list_expenses(
+        db, user_id=cat.user_id, category_id=cat.id, search_text="coffee"
+    ),
+    "paginate_cursor": lambda db, cat: _second_page(db, user_id=cat.user_id),
+    "paginate_cursor_date_range": lambda db, cat: _second_page(
+        db, user_id=cat.user_id, from_dt=datetime(2020, 1, 1)
+    ),
+    "paginate_cursor_category": lambda db, cat: _second_page(
+        db, user_id=cat.user_id, category_id=cat.id
+    ),
+    "summary_by_category": lambda db, cat: crud.summary_by_category(
+        db, user_id=cat.user_id
+    ),
+    "summary_by_month": lambda db, cat: crud.summary_by_month(db, user_id=cat.user_id),
+    "summary_by_day": lambda db, cat: crud.summary_by_day(db, user_id=cat.user_id),
+    "summary_by_currency": lambda db, cat: crud.summary_by_currency(
+        db, user_id=cat.user_id
+    ),
+    "summary_by_category_range": lambda db, cat: crud.summary_by_category(
+        db, user_id=cat.user_id, from_dt=datetime(2020, 1, 1), category_id=cat.id
+    ),
+    "summary_by_category_converted": lambda db, cat: crud.summary_by_category(
+        db, user_id=cat.user_id, target_currency="EUR"
+    ),
+    "summary_by_month_range": lambda db, cat: crud.summary_by_month(
+        db,
+        user_id=cat.user_id,
+        from_dt=datetime(2020, 1, 1),
+        to_dt=datetime(2100, 1, 1),
+    ),
+}
+
+
+@pytest.mark.parametrize("name", sorted(QUERIES))
+def test_query_uses_an_index(db, dataset, statements, name):
+    statements.clear()
+    QUERIES[name](db, dataset)
+    assert statements, f"{name} issued no SELECT"
+
+    for statement, parameters in statements:
+        plan = query_plan(db, statement, parameters)
+        # reading back an already aggregated subquery is not a table scan
+        subqueries = {
+            step.split()[-1] for step in plan if step.startswith("CO-ROUTINE")
+        }
+        scans = [
+            step
+            for step in plan
+            if (m := TABLE_SCAN.match(step)) and m.group(2) not in subqueries
+        ]
+        assert not scans, f"{name} falls back to a table scan: {plan}\n{statement}"
+
+
+@pytest.mark.parametrize(
+    "filters, index",
+    [
+        ({"from_dt": datetime(2020, 1, 1)}, "ix_expenses_user_id_created_at_id"),
+        (
+            {"from_dt": datetime(2020, 1, 1), "to_dt": datetime(2100, 1, 1)},
+            "ix_expenses_user_id_created_at_id",
+        ),
+        (
+            {"to_dt": datetime(2100, 1, 1), "category_id": None},
+            "ix_expenses_user_id_category_id_created_at",
+        ),
+    ],
+)
+def test_date_range_is_an_index_range_scan(db, dataset, statements, filters, index):
+    if "category_id" in filters:
+        filters = {**filters, "category_id": dataset.id}
+    statements.clear()
+    crud.list_expenses(db, user_id=dataset.user_id, **filters)
+
+    for statement, parameters in statements:
+        if "FROM expenses" not in statement:
+            continue
+        plan = " ".join(query_plan(db, statement, parameters))
+        assert f"USING INDEX {index} (" in plan or f"COVERING INDEX {index} (" in plan
+        assert "created_at>" in plan or "created_at<" in plan, plan
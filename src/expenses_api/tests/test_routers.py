@@ -1,7 +1,15 @@
+import json
 import pytest
+from datetime import datetime, timedelta
 from decimal import Decimal
 
-from expenses_api import crud
+from pydantic import SecretStr
+
+from expenses_api import changes, crud, fx, security
+from expenses_api.models import User
+from expenses_api.instrumentation import metrics
+from expenses_api.security import make_password_context, pwd_context, user_cache
+from expenses_api.settings import settings
 
 # ============= CONFIGURATION TEST DATABASE =============
 
@@ -23,9 +31,9 @@ def auth_headers(auth_token):
 
 
 @pytest.fixture
-def test_category(db):
+def test_category(db, test_user):
     """Créer une catégorie de test avec crud.py"""
-    category = crud.create_category(db, "Alimentation")
+    category = crud.create_category(db, "Alimentation", user_id=test_user.id)
     return category
 
 
@@ -83,11 +91,48 @@ class TestAuthentication:
         )
         assert response.status_code == 401
 
+    def test_login_rehashes_outdated_password(self, client, db):
+        """Test rehash au login quand les paramètres argon2 ont changé"""
+        weak = make_password_context(time_cost=1, memory_cost=8192, parallelism=1)
+        user = User(username="legacy", hashed_password=weak.hash("legacypass1"))
+        db.add(user)
+        db.commit()
+
+        response = client.post(
+            "/auth/token", data={"username": "legacy", "password": "legacypass1"}
+        )
+        assert response.status_code == 200
+        db.refresh(user)
+        assert not pwd_context.needs_update(user.hashed_password)
+        assert pwd_context.verify("legacypass1", user.hashed_password)
+
+    def test_login_busy_when_hash_queue_full(self, client, test_user, monkeypatch):
+        """Test 503 quand la file de hachage est pleine"""
+        monkeypatch.setattr(security, "_hash_slots", security.threading.Semaphore(0))
+        response = client.post(
+            "/auth/token", data={"username": "testuser", "password": "testpass123"}
+        )
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
     def test_access_protected_route_without_token(self, client):
         """Test route protégée sans token (get_current_user)"""
         response = client.get("/categories")
         assert response.status_code == 401
 
+    def test_current_user_cached_between_requests(
+        self, client, auth_headers, db, test_user
+    ):
+        """Test cache utilisateur (get_current_user sans SELECT répété)"""
+        client.get("/categories", headers=auth_headers)
+        client.get("/categories", headers=auth_headers)
+        assert user_cache.stats()["misses"] == 1
+        assert user_cache.stats()["hits"] == 1
+
+        test_user.is_active = False
+        db.commit()
+        assert user_cache.get("testuser") is None
+
     def test_access_protected_route_with_invalid_token(self, client):
         """Test token JWT invalide (security.py)"""
         response = client.get(
@@ -220,14 +265,62 @@ class TestExpenses:
         assert response.status_code == 400
         assert "unsupported currency" in response.json()["detail"].lower()
 
+    def test_create_expense_currency_from_fx_rates(
+        self, client, auth_headers, db, test_category
+    ):
+        """Test devises acceptées = celles de la table fx_rates"""
+        fx.load_rates(db, fx.parse_rates(["date,currency,rate", "2024-01-02,GBP,0.85"]))
+        response = client.post(
+            "/expenses",
+            json={"category_id": test_category.id, "amount": "5", "currency": "gbp"},
+            headers=auth_headers,
+        )
+        assert response.status_code == 201
+        assert response.json()["currency"] == "GBP"
+
     def test_create_expense_invalid_category(self, client, auth_headers):
-        """Test FK constraint (models.py: ForeignKey)"""
+        """Test catégorie inexistante refusée"""
         response = client.post(
             "/expenses",
             json={"category_id": 99999, "amount": "50.00", "currency": "EUR"},
             headers=auth_headers,
         )
-        assert response.status_code == 201
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Category not found"
+
+    def test_other_users_data_is_invisible(
+        self, client, auth_headers, db, test_category
+    ):
+        """Test isolation par utilisateur (user_id)"""
+        other_user = User(username="other", hashed_password="x")
+        db.add(other_user)
+        db.commit()
+        theirs = crud.create_category(db, "Alimentation", user_id=other_user.id)
+        their_expense = crud.create_expense(db, theirs.id, Decimal("99"), "EUR")
+        mine = crud.create_expense(db, test_category.id, Decimal("1"), "EUR")
+        assert their_expense.user_id == other_user.id
+
+        listed = client.get("/expenses", headers=auth_headers).json()
+        assert [e["id"] for e in listed["items"]] == [mine.id]
+        categories = client.get("/categories", headers=auth_headers).json()
+        assert [c["id"] for c in categories] == [test_category.id]
+        for url in (f"/expenses/{their_expense.id}", f"/categories/{theirs.id}"):
+            assert client.delete(url, headers=auth_headers).status_code == 404
+        assert (
+            client.get(
+                f"/expenses/{their_expense.id}", headers=auth_headers
+            ).status_code
+            == 404
+        )
+
+        response = client.post(
+            "/expenses",
+            json={"category_id": theirs.id, "amount": "5.00", "currency": "EUR"},
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+        report = client.get("/reports/by-currency", headers=auth_headers).json()
+        assert report == [{"key": "EUR", "currency": "EUR", "total_amount": "1.00"}]
 
     def test_get_expense_by_id(self, client, auth_headers, db, test_category):
         """Test GET /expenses/{id} (crud.get_expense)"""
@@ -271,10 +364,127 @@ class TestExpenses:
         assert data["page"] == 1
         assert data["size"] == 10
 
-    def test_list_expenses_filter_by_category(self, client, auth_headers, db):
+    def test_list_items_match_single_expense(self, client, auth_headers, test_category):
+        """Test GET /expenses (sans validation) == GET /expenses/{id} (validé)"""
+        created = client.post(
+            "/expenses",
+            json={
+                "category_id": test_category.id,
+                "amount": "7.5",
+                "currency": "usd",
+                "name": "Café",
+            },
+            headers=auth_headers,
+        ).json()
+
+        listed = client.get("/expenses", headers=auth_headers).json()["items"]
+        single = client.get(f"/expenses/{created['id']}", headers=auth_headers)
+        assert listed == [single.json()]
+        assert list(listed[0]) == list(single.json())  # same key order
+        assert listed[0]["amount"] == "7.50"
+
+    def test_get_expenses_by_ids(self, client, auth_headers, db, test_category):
+        """Test GET /expenses?ids=... (crud.get_expenses, un seul IN)"""
+        ids = [
+            crud.create_expense(db, test_category.id, Decimal(i + 1), "EUR").id
+            for i in range(3)
+        ]
+
+        response = client.get(
+            f"/expenses?ids={ids[2]},99999,{ids[0]}", headers=auth_headers
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["id"] for item in data["items"]] == [ids[2], ids[0]]
+        assert data["items"][0]["amount"] == "3.00"
+        assert data["missing"] == [99999]
+
+        assert client.get("/expenses?ids=1,x", headers=auth_headers).status_code == 400
+        too_many = ",".join(str(i) for i in range(settings.MULTI_GET_MAX_IDS + 1))
+        response = client.get(f"/expenses?ids={too_many}", headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_changes_feed(self, client, auth_headers, db, test_category):
+        """Test GET /expenses/changes?since=... (upserts, suppressions, 410)"""
+        older = crud.create_expense(db, test_category.id, Decimal("5"), "EUR")
+        first = client.get("/expenses/changes", headers=auth_headers).json()
+        assert [c["id"] for c in first["changes"]] == [older.id]
+        assert first["changes"][0]["expense"]["amount"] == "5.00"
+        assert first["has_more"] is False
+        since = first["next_since"]
+
+        newer = crud.create_expense(db, test_category.id, Decimal("7"), "EUR")
+        client.delete(f"/expenses/{older.id}", headers=auth_headers)
+        response = client.get(
+            f"/expenses/changes?since={since}", headers=auth_headers
+        ).json()
+        assert [(c["op"], c["id"]) for c in response["changes"]] == [
+            ("upsert", newer.id),
+            ("delete", older.id),
+        ]
+        assert response["changes"][1]["expense"] is None
+
+        changes.compact(db, timedelta(0))
+        expired = client.get(f"/expenses/changes?since={since}", headers=auth_headers)
+        assert expired.status_code == 410
+
+    def test_list_expenses_with_cursor(self, client, auth_headers, db, test_category):
+        """Test GET /expenses?cursor=... (keyset pagination)"""
+        for i in range(5):
+            crud.create_expense(db, test_category.id, Decimal(i + 1), "EUR")
+
+        first = client.get("/expenses?size=2", headers=auth_headers).json()
+        assert first["total"] == 5
+        assert first["next_cursor"] is not None
+
+        seen = [item["id"] for item in first["items"]]
+        cursor = first["next_cursor"]
+        while cursor:
+            data = client.get(
+                f"/expenses?size=2&cursor={cursor}", headers=auth_headers
+            ).json()
+            assert data["total"] is None
+            assert data["page"] is None
+            seen += [item["id"] for item in data["items"]]
+            cursor = data["next_cursor"]
+
+        assert len(seen) == len(set(seen)) == 5
+        assert seen == sorted(seen, reverse=True)
+
+    def test_list_expenses_invalid_cursor(self, client, auth_headers):
+        """Test curseur invalide"""
+        response = client.get("/expenses?cursor=garbage", headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_list_expenses_search(self, client, auth_headers, db, test_category):
+        """Test recherche plein texte ?q= (meilleurs résultats d'abord)"""
+        for name in ["Taxi", "Dîner au restaurant", "Restaurant", None]:
+            crud.create_expense(db, test_category.id, Decimal("10"), "EUR", name)
+
+        response = client.get("/expenses?q=restau&size=1", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 2
+        assert [item["name"] for item in data["items"]] == ["Restaurant"]
+
+        second = client.get("/expenses?q=restau&size=1&page=2", headers=auth_headers)
+        assert [item["name"] for item in second.json()["items"]] == [
+            "Dîner au restaurant"
+        ]
+        assert (
+            client.get("/expenses?q=diner", headers=auth_headers).json()["total"] == 1
+        )
+
+        for query in ["q=%3F%21", "q=taxi&cursor=abc"]:
+            response = client.get(f"/expenses?{query}", headers=auth_headers)
+            assert response.status_code == 400
+
+    def test_list_expenses_filter_by_category(
+        self, client, auth_headers, db, test_user
+    ):
         """Test filtre category_id (crud.list_expenses)"""
-        cat1 = crud.create_category(db, "Food")
-        cat2 = crud.create_category(db, "Transport")
+        cat1 = crud.create_category(db, "Food", user_id=test_user.id)
+        cat2 = crud.create_category(db, "Transport", user_id=test_user.id)
 
         crud.create_expense(db, cat1.id, Decimal("10"), "EUR")
         crud.create_expense(db, cat1.id, Decimal("20"), "EUR")
@@ -302,6 +512,123 @@ class TestExpenses:
         assert data["total"] == 1
         assert data["items"][0]["amount"] == "150.00"
 
+    def test_list_expenses_filter_by_date_range(
+        self, client, auth_headers, db, test_category
+    ):
+        """Test from_dt/to_dt combinés avec les autres filtres"""
+        for day, amount in (
+            ("2024-01-10", "10"),
+            ("2024-02-10", "20"),
+            ("2024-03-10", "30"),
+        ):
+            expense = crud.create_expense(db, test_category.id, Decimal(amount), "EUR")
+            expense.created_at = datetime.fromisoformat(f"{day} 12:00:00")
+        db.commit()
+
+        response = client.get(
+            "/expenses?from_dt=2024-02-01T00:00:00&to_dt=2024-03-10T12:00:00",
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        assert [e["amount"] for e in response.json()["items"]] == ["20.00"]
+        assert response.json()["total"] == 1
+
+        response = client.get(
+            f"/expenses?from_dt=2024-01-01T00:00:00Z&min_amount=15"
+            f"&category_id={test_category.id}",
+            headers=auth_headers,
+        )
+        assert [e["amount"] for e in response.json()["items"]] == ["30.00", "20.00"]
+
+    def test_bulk_create_json_array(self, client, auth_headers, db, test_category):
+        """Test POST /expenses/bulk avec un tableau JSON et erreurs par ligne"""
+        rows = [
+            {"category_id": test_category.id, "amount": "10.00", "currency": "eur"},
+            {"category_id": test_category.id, "amount": "oops", "currency": "EUR"},
+            {"category_id": 99999, "amount": "5.00", "currency": "EUR"},
+            {"category_id": test_category.id, "amount": "1.00", "currency": "GBP"},
+            {"category_id": test_category.id, "amount": "20.00", "currency": "USD"},
+        ]
+        response = client.post("/expenses/bulk", json=rows, headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["inserted"] == 2
+        assert [e["index"] for e in data["errors"]] == [1, 2, 3]
+        assert "amount" in data["errors"][0]["detail"]
+        assert data["errors"][1]["detail"] == "Category not found"
+
+        first = crud.get_expense(db, data["ids"][0])
+        assert first.currency == "EUR"
+        assert first.amount == Decimal("10.00")
+
+    def test_bulk_create_ndjson(self, client, auth_headers, db, test_category):
+        """Test POST /expenses/bulk en NDJSON"""
+        lines = [
+            f'{{"category_id": {test_category.id}, "amount": "{i}.50", "currency": "EUR"}}'
+            for i in range(5)
+        ]
+        response = client.post(
+            "/expenses/bulk",
+            content="\n".join(lines + ["{not json"]) + "\n",
+            headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["inserted"] == 5
+        assert [e["index"] for e in data["errors"]] == [5]
+        assert crud.count_expenses(db) == 5
+
+    def test_bulk_create_rejects_non_array(self, client, auth_headers):
+        """Test corps JSON qui n'est pas un tableau"""
+        response = client.post(
+            "/expenses/bulk", json={"amount": "1"}, headers=auth_headers
+        )
+        assert response.status_code == 400
+
+    def test_export_csv(self, client, auth_headers, db, test_category):
+        """Test GET /expenses/export?format=csv"""
+        other = crud.create_category(db, "Transport", user_id=test_category.user_id)
+        crud.create_expense(db, test_category.id, Decimal("10"), "EUR", "Pain")
+        crud.create_expense(db, other.id, Decimal("20"), "USD", "Bus, ticket")
+        crud.create_expense(db, test_category.id, Decimal("30"), "EUR")
+
+        response = client.get(
+            f"/expenses/export?format=csv&category_id={test_category.id}",
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.splitlines()
+        assert lines[0] == "id,category_id,amount,currency,name,created_at,updated_at"
+        assert len(lines) == 3
+        assert ",10.00,EUR,Pain," in lines[1]
+
+    def test_export_ndjson(self, client, auth_headers, db, test_category):
+        """Test GET /expenses/export?format=ndjson"""
+        for amount in ("5", "50", "500"):
+            crud.create_expense(db, test_category.id, Decimal(amount), "EUR")
+
+        response = client.get(
+            "/expenses/export?format=ndjson&min_amount=10", headers=auth_headers
+        )
+        assert response.status_code == 200
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["amount"] for r in rows] == ["50.00", "500.00"]
+        assert set(rows[0]) == {
+            "id",
+            "category_id",
+            "amount",
+            "currency",
+            "name",
+            "created_at",
+            "updated_at",
+        }
+
+    def test_export_unknown_format(self, client, auth_headers):
+        """Test format d'export invalide"""
+        response = client.get("/expenses/export?format=xml", headers=auth_headers)
+        assert response.status_code == 422
+
     def test_delete_expense_success(self, client, auth_headers, db, test_category):
         """Test DELETE /expenses/{id}"""
         expense = crud.create_expense(db, test_category.id, Decimal("100"), "EUR")
@@ -315,6 +642,307 @@ class TestExpenses:
         response = client.delete("/expenses/99999", headers=auth_headers)
         assert response.status_code == 404
 
+    def test_patch_expense_with_if_match(self, client, auth_headers, db, test_category):
+        """Test PATCH /expenses/{id} : ETag -> If-Match, 412 si périmé"""
+        expense = client.post(
+            "/expenses",
+            json={
+                "category_id": test_category.id,
+                "amount": "10.00",
+                "currency": "EUR",
+            },
+            headers=auth_headers,
+        ).json()
+        etag = client.get(f"/expenses/{expense['id']}", headers=auth_headers).headers[
+            "etag"
+        ]
+
+        first = client.patch(
+            f"/expenses/{expense['id']}",
+            json={"amount": "12.50", "name": "Lunch"},
+            headers={**auth_headers, "If-Match": etag},
+        )
+        assert first.status_code == 200
+        assert first.json()["amount"] == "12.50"
+        assert first.json()["name"] == "Lunch"
+        assert first.headers["etag"] != etag
+
+        # a second writer still holding the old ETag loses
+        stale = client.patch(
+            f"/expenses/{expense['id']}",
+            json={"amount": "99.00"},
+            headers={**auth_headers, "If-Match": etag},
+        )
+        assert stale.status_code == 412
+
+        again = client.patch(
+            f"/expenses/{expense['id']}",
+            json={"currency": "usd"},
+            headers={**auth_headers, "If-Match": first.headers["etag"]},
+        )
+        assert again.status_code == 200
+        assert again.json()["currency"] == "USD"
+        report = client.get("/reports/by-currency", headers=auth_headers).json()
+        assert report == [{"key": "USD", "currency": "USD", "total_amount": "12.50"}]
+
+        # deleted in the meantime: the precondition fails the same way
+        client.delete(f"/expenses/{expense['id']}", headers=auth_headers)
+        gone = client.patch(
+            f"/expenses/{expense['id']}",
+            json={"amount": "1.00"},
+            headers={**auth_headers, "If-Match": again.headers["etag"]},
+        )
+        assert gone.status_code == 412
+
+    def test_patch_expense_validation(self, client, auth_headers, test_category):
+        """Test PATCH : champs nuls, devise, catégorie, ID inexistant"""
+        expense_id = client.post(
+            "/expenses",
+            json={
+                "category_id": test_category.id,
+                "amount": "10.00",
+                "currency": "EUR",
+            },
+            headers=auth_headers,
+        ).json()["id"]
+        url = f"/expenses/{expense_id}"
+        cases = [
+            (url, {"amount": None}, {}, 422),
+            (url, {"currency": "GBP"}, {}, 400),
+            (url, {"category_id": 99999}, {}, 400),
+            (url, {"name": "x"}, {"If-Match": 'W/"1"'}, 412),
+            ("/expenses/99999", {"name": "x"}, {}, 404),
+            ("/expenses/99999", {"name": "x"}, {"If-Match": "*"}, 412),
+            (url, {"name": "x"}, {}, 200),
+        ]
+        for path, body, headers, expected in cases:
+            response = client.patch(
+                path, json=body, headers={**auth_headers, **headers}
+            )
+            assert response.status_code == expected, body
+
+
+# ============= TESTS REPORTS  =============
+class TestReports:
+    def test_report_by_category(self, client, auth_headers, db, test_category):
+        """Test GET /reports/by-category (crud.summary_by_category)"""
+        crud.create_expense(db, test_category.id, Decimal("10"), "EUR")
+        crud.create_expense(db, test_category.id, Decimal("15"), "EUR")
+
+        response = client.get("/reports/by-category", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json() == [
+            {"key": "Alimentation", "currency": "EUR", "total_amount": "25.00"}
+        ]
+        assert response.headers["etag"]
+        assert response.headers["last-modified"]
+
+    def test_report_not_modified_until_write(
+        self, client, auth_headers, db, test_category
+    ):
+        """Test ETag / If-None-Match -> 304 tant que rien ne change"""
+        expense = crud.create_expense(db, test_category.id, Decimal("10"), "EUR")
+        first = client.get("/reports/by-month", headers=auth_headers)
+        etag = first.headers["etag"]
+
+        again = client.get(
+            "/reports/by-month", headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert again.status_code == 304
+        assert again.content == b""
+
+        crud.delete_expense(db, expense.id)
+        changed = client.get(
+            "/reports/by-month", headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert changed.status_code == 200
+        assert changed.json() == []
+        assert changed.headers["etag"] != etag
+
+    def test_report_etag_depends_on_filters(self, client, auth_headers):
+        """Test ETag différent selon les filtres"""
+        plain = client.get("/reports/by-currency", headers=auth_headers)
+        filtered = client.get(
+            "/reports/by-currency?category_id=1", headers=auth_headers
+        )
+        assert plain.headers["etag"] != filtered.headers["etag"]
+
+    def test_report_by_day_with_date_range(
+        self, client, auth_headers, db, test_category
+    ):
+        """Test GET /reports/by-day?from_dt=&to_dt="""
+        expense = crud.create_expense(db, test_category.id, Decimal("12"), "USD")
+        day = expense.created_at.strftime("%Y-%m-%d")
+
+        response = client.get(
+            f"/reports/by-day?from_dt={day}T00:00:00", headers=auth_headers
+        )
+        assert response.json() == [
+            {"key": day, "currency": "USD", "total_amount": "12.00"}
+        ]
+
+        response = client.get(
+            f"/reports/by-day?to_dt={day}T00:00:00", headers=auth_headers
+        )
+        assert response.json() == []
+
+    def test_report_in_target_currency(self, client, auth_headers, db, test_category):
+        """Test GET /reports/by-category?target_currency="""
+        fx.load_rates(db, fx.parse_rates(["date,currency,rate", "2000-01-01,USD,1.1"]))
+        crud.create_expense(db, test_category.id, Decimal("10"), "EUR")
+        crud.create_expense(db, test_category.id, Decimal("22"), "USD")
+
+        response = client.get(
+            "/reports/by-category?target_currency=usd", headers=auth_headers
+        )
+        assert response.json() == [
+            {"key": "Alimentation", "currency": "USD", "total_amount": "33.00"}
+        ]
+
+        response = client.get(
+            "/reports/by-category?target_currency=JPY", headers=auth_headers
+        )
+        assert response.status_code == 400
+
+    def test_report_in_target_currency_without_rates(
+        self, client, auth_headers, db, test_category
+    ):
+        """Test 400 plutôt qu'un total incomplet quand un taux manque"""
+        crud.create_expense(db, test_category.id, Decimal("22"), "USD")
+        response = client.get(
+            "/reports/by-month?target_currency=EUR", headers=auth_headers
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Missing exchange rate"
+
+
+# ============= TESTS ASYNC ENGINE =============
+class TestAsyncEngine:
+    def test_expense_flow_on_aiosqlite(self, async_client):
+        """Test parcours complet sur une vraie AsyncSession (aiosqlite)"""
+        client = async_client
+        credentials = {"username": "asyncuser", "password": "asyncpass123"}
+        assert client.post("/auth/register", json=credentials).status_code == 201
+        token = client.post("/auth/token", data=credentials).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        category = client.post(
+            "/categories", json={"name": "Transport"}, headers=headers
+        ).json()
+        expense = client.post(
+            "/expenses",
+            json={
+                "category_id": category["id"],
+                "amount": "12.00",
+                "currency": "EUR",
+                "name": "Train ticket",
+            },
+            headers=headers,
+        ).json()
+        bulk = client.post(
+            "/expenses/bulk",
+            json=[{"category_id": category["id"], "amount": "3.00", "currency": "EUR"}],
+            headers=headers,
+        )
+        assert bulk.json()["inserted"] == 1
+
+        etag = client.get(f"/expenses/{expense['id']}", headers=headers).headers["etag"]
+        patched = client.patch(
+            f"/expenses/{expense['id']}",
+            json={"amount": "15.00"},
+            headers={**headers, "If-Match": etag},
+        )
+        assert patched.status_code == 200
+
+        page = client.get("/expenses?q=train", headers=headers).json()
+        assert [item["id"] for item in page["items"]] == [expense["id"]]
+        report = client.get("/reports/by-category", headers=headers).json()
+        assert report == [
+            {"key": "Transport", "currency": "EUR", "total_amount": "18.00"}
+        ]
+
+        # streamed from the session after the route has returned
+        export = client.get("/expenses/export?format=ndjson", headers=headers)
+        assert export.status_code == 200
+        rows = [json.loads(line) for line in export.text.splitlines()]
+        assert sorted(row["amount"] for row in rows) == ["15.00", "3.00"]
+
+        assert (
+            client.delete(f"/expenses/{expense['id']}", headers=headers).status_code
+            == 204
+        )
+        feed = client.get("/expenses/changes?since=0", headers=headers).json()
+        assert [(c["op"], c["id"]) for c in feed["changes"]] == [
+            ("upsert", bulk.json()["ids"][0]),
+            ("delete", expense["id"]),
+        ]
+
+
+# ============= TESTS INSTRUMENTATION =============
+class TestInstrumentation:
+    SCRAPER = {"Authorization": "Bearer scrape-me"}
+
+    @pytest.fixture
+    def instrumented(self, monkeypatch):
+        monkeypatch.setattr(settings, "INSTRUMENTATION_ENABLED", True)
+        monkeypatch.setattr(settings, "METRICS_TOKEN", SecretStr("scrape-me"))
+        metrics.reset()
+        yield
+        metrics.reset()
+
+    def test_metrics_hidden_when_disabled(self, client, monkeypatch):
+        """Test /metrics : 404 sans instrumentation ou sans jeton"""
+        assert client.get("/metrics", headers=self.SCRAPER).status_code == 404
+        # instrumentation on, but no token configured
+        monkeypatch.setattr(settings, "INSTRUMENTATION_ENABLED", True)
+        assert client.get("/metrics", headers=self.SCRAPER).status_code == 404
+
+    def test_metrics_rejects_other_tokens(self, client, auth_headers, instrumented):
+        """Test /metrics : 401 sans le bon jeton Bearer"""
+        for headers in ({}, {"Authorization": "Bearer nope"}, auth_headers):
+            response = client.get("/metrics", headers=headers)
+            assert response.status_code == 401
+            assert response.headers["www-authenticate"] == "Bearer"
+
+    def test_server_timing_breakdown(self, client, auth_headers, instrumented):
+        """Test en-tête Server-Timing : phases et nombre de requêtes SQL"""
+        response = client.get("/categories", headers=auth_headers)
+        timing = response.headers["server-timing"]
+        for part in ("auth;dur=", "db;dur=", "endpoint;dur=", "ser;dur=", "total;"):
+            assert part in timing
+        # user lookup (cache miss), categories stamp and the category SELECT
+        assert 'desc="3 queries"' in timing
+        # then only the stamp is read again
+        response = client.get("/categories", headers=auth_headers)
+        assert 'desc="1 queries"' in response.headers["server-timing"]
+
+    def test_metrics_endpoint(self, client, auth_headers, instrumented):
+        """Test /metrics : compteurs Prometheus par route et par cache"""
+        client.get("/categories", headers=auth_headers)
+        client.get("/categories", headers=auth_headers)
+
+        body = client.get("/metrics", headers=self.SCRAPER).text
+        assert "# TYPE expenses_api_http_requests_total counter" in body
+        assert (
+            'expenses_api_http_requests_total{method="GET",route="/categories",'
+            'status="200"} 2' in body
+        )
+        assert (
+            'expenses_api_db_queries_per_request_count{route="/categories"} 2' in body
+        )
+        assert 'expenses_api_cache_hits_total{cache="user_cache"} 1' in body
+
+    def test_slow_queries_logged(
+        self, client, auth_headers, instrumented, monkeypatch, caplog
+    ):
+        """Test requêtes lentes : journalisées et comptées"""
+        monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0)
+        with caplog.at_level("WARNING", logger="expenses_api.sql"):
+            client.get("/categories", headers=auth_headers)
+        assert any("FROM categories" in r.getMessage() for r in caplog.records)
+        body = client.get("/metrics", headers=self.SCRAPER).text
+        assert "expenses_api_db_slow_queries_total" in body
+
 
 # ============= TEST HEALTH CHECK =============
 
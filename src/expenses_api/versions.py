@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import DataVersion
+
+EXPENSES = "expenses"
+CATEGORIES = "categories"
+FX_RATES = "fx_rates"
+# not a write counter: the seq up to which tombstones have been compacted
+CHANGES_HORIZON = "expense_changes_horizon"
+
+
+class Stamp(NamedTuple):
+    version: int
+    updated_at: Optional[datetime]
+
+
+def bump(db: Session, name: str) -> None:
+    now = datetime.now(timezone.utc)
+    stmt = sqlite_insert(DataVersion).values(name=name, version=1, updated_at=now)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"version": DataVersion.version + 1, "updated_at": now},
+        )
+    )
+
+
+def advance(db: Session, name: str, value: int) -> None:
+    """Raise a stamp to ``value``, unless it is already past it."""
+    now = datetime.now(timezone.utc)
+    stmt = sqlite_insert(DataVersion).values(name=name, version=value, updated_at=now)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={
+                "version": func.max(DataVersion.version, stmt.excluded.version),
+                "updated_at": now,
+            },
+        )
+    )
+
+
+def read(db: Session, *names: str) -> Dict[str, Stamp]:
+    rows = db.execute(
+        select(DataVersion.name, DataVersion.version, DataVersion.updated_at).where(
+            DataVersion.name.in_(names)
+        )
+    )
+    found = {
+        name: Stamp(version, updated_at.replace(tzinfo=timezone.utc))
+        for name, version, updated_at in rows
+    }
+    return {name: found.get(name, Stamp(0, None)) for name in names}